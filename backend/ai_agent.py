@@ -1,10 +1,15 @@
+import asyncio
+import time
 from typing import TypedDict
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage
 from langgraph.graph import StateGraph, END
-from config import OPENAI_API_KEY
-from tools import query_medgemma, call_emergency, query_doc
-import openai
+from config import OPENAI_API_KEY, LOCAL_ROUTER_ENABLED, LOCAL_ROUTER_MIN_CONFIDENCE, COMBINE_STRATEGY
+from config import BATCH_ROUTING_CHUNK
+from fast_router import local_router, ROUTES
+from metrics import metrics
+from memory import context_messages, split_window, summarize
+from tracing import trace_call, traced_node
+from tools import query_medgemma, emergency_dispatcher, query_doc
 import json
 
 # ---------------- STATE ----------------
@@ -19,10 +24,36 @@ class GraphState(TypedDict):
     final_response: str
     next: list[str]
     image_base64: str
+    history: list[dict]
+    summary: str
+    session_id: str
+    routes: list[str]
+    documents: list
+    dispatch_emergency: bool
 
 # ---------------- ROUTER ----------------
 
-llm = ChatOpenAI(model="gpt-4", temperature=0.2, api_key=OPENAI_API_KEY)
+# Created on first use (see get_llm / get_vision_client) to keep imports cheap
+llm = None
+vision_client = None
+
+
+def get_llm():
+    global llm
+    if llm is None:
+        from langchain_openai import ChatOpenAI
+        # stream_usage: token counts are reported even when the combiner is streamed
+        llm = ChatOpenAI(model="gpt-4", temperature=0.2, api_key=OPENAI_API_KEY, stream_usage=True)
+    return llm
+
+
+def get_vision_client():
+    global vision_client
+    if vision_client is None:
+        from openai import AsyncOpenAI
+        vision_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return vision_client
+
 
 ROUTING_PROMPT = """
 You are a triage assistant for a mental and physical health AI system.
@@ -37,30 +68,121 @@ Respond ONLY as a JSON list of tool names.
 For example: ["mental_specialist", "health_specialist"]
 """
 
-def router_node(state: GraphState) -> dict:
-    user_msg = state.get("input", HumanMessage(content="")).content
-    response = llm.invoke([
+async def llm_route(user_msg: str) -> list[str]:
+    response = await get_llm().ainvoke([
         HumanMessage(content=ROUTING_PROMPT + "\nMessage: " + user_msg)
     ])
     try:
         tools = json.loads(response.content.strip())
-        valid = {"mental_specialist", "health_specialist", "find_therapist", "emergency", "vision_analysis"}
-        tools = [tool for tool in tools if tool in valid]
-        return {"next": tools or ["mental_specialist"]}
+        return [tool for tool in tools if tool in ROUTES]
+    except Exception:
+        return []
+
+ROUTING_BATCH_PROMPT = """
+You are a triage assistant for a mental and physical health AI system.
+For each of the numbered user messages below, choose all relevant tools:
+- "mental_specialist": for stress, emotions, focus issues
+- "health_specialist": for physical symptoms or illness
+- "find_therapist": if user asks for professional therapist nearby
+- "emergency": if there's any suicide, harm, or urgent help signal
+
+Respond ONLY as a JSON list with one list of tool names per message, in order.
+For example, for two messages: [["mental_specialist"], ["health_specialist", "find_therapist"]]
+"""
+
+async def llm_route_batch(messages: list[str]) -> list[list[str]]:
+    """
+    Routes several messages with one LLM call. Falls back to one call per
+    message if the reply does not line up with the input.
+    """
+    numbered = "\n".join(f"{i}. {json.dumps(message)}" for i, message in enumerate(messages, 1))
+    # runs outside the graph, so it is traced here rather than by the callback
+    with trace_call("openai", "batch_router") as span:
+        response = await get_llm().ainvoke([
+            HumanMessage(content=ROUTING_BATCH_PROMPT + "\nMessages:\n" + numbered)
+        ])
+        if response.usage_metadata:
+            span["tokens_in"], span["tokens_out"] = response.usage_metadata["input_tokens"], response.usage_metadata["output_tokens"]
+    try:
+        routes = json.loads(response.content.strip())
+        if isinstance(routes, list) and len(routes) == len(messages) and all(isinstance(r, list) for r in routes):
+            return [[tool for tool in tools if tool in ROUTES] for tools in routes]
     except Exception:
-        return {"next": ["mental_specialist"]}
+        pass
+    print(f"[router] batched routing reply unusable for {len(messages)} messages; routing one by one")
+    return list(await asyncio.gather(*(llm_route(message) for message in messages)))
+
+async def route_batch(messages: list[str]) -> list[list[str]]:
+    """
+    Routes every message: locally where the fast router is confident, and the
+    rest through batched LLM prompts of BATCH_ROUTING_CHUNK messages each.
+    If a prompt fails, its messages keep their local routes.
+    """
+    routes, ambiguous = [], []
+    for i, message in enumerate(messages):
+        local_tools, confidence = local_router.route(message)
+        routes.append(local_tools)
+        if not (LOCAL_ROUTER_ENABLED and confidence >= LOCAL_ROUTER_MIN_CONFIDENCE):
+            ambiguous.append(i)
+    metrics.inc("batch_routing", len(messages) - len(ambiguous), tier="local")
+    metrics.inc("batch_routing", len(ambiguous), tier="llm")
+
+    async def route_chunk(chunk: list[int]) -> list[list[str]]:
+        try:
+            return await llm_route_batch([messages[i] for i in chunk])
+        except Exception as e:
+            # one failed prompt should not fail the whole batch
+            print(f"[router] batched routing failed for {len(chunk)} messages, keeping their local routes: {e}")
+            metrics.inc("batch_routing_errors")
+            return [[] for _ in chunk]
+
+    chunks = [ambiguous[i:i + BATCH_ROUTING_CHUNK] for i in range(0, len(ambiguous), BATCH_ROUTING_CHUNK)]
+    results = await asyncio.gather(*(route_chunk(chunk) for chunk in chunks))
+    for chunk, chunk_routes in zip(chunks, results):
+        for i, tools in zip(chunk, chunk_routes):
+            routes[i] = tools or routes[i]
+    return routes
+
+async def router_node(state: GraphState) -> dict:
+    user_msg = state.get("input", HumanMessage(content="")).content
+    # Obvious messages are routed locally; the LLM only sees the ambiguous ones
+    # With session memory the previous turn's outputs are still in the state
+    cleared = {key: "" for key, _, _ in RESPONSE_PARTS}
+    if state.get("routes"):
+        # /ask/batch routes all of its messages up front
+        return {"next": state["routes"], **cleared}
+    local_tools, confidence = local_router.route(user_msg, has_image=bool(state.get("image_base64")))
+    if LOCAL_ROUTER_ENABLED and confidence >= LOCAL_ROUTER_MIN_CONFIDENCE:
+        return {"next": local_tools, **cleared}
+
+    tools = await llm_route(user_msg)
+    return {"next": tools or local_tools, **cleared}
 
 # ---------------- NODES ----------------
 
-def ask_mental_health_specialist(state: GraphState) -> dict:
+async def ask_mental_health_specialist(state: GraphState) -> dict:
     query = state['input'].content
-    response = query_medgemma(query)  # Expects a string
+    # Crisis messages and ongoing conversations always get a fresh answer
+    use_cache = "emergency" not in state.get("next", []) and not state.get("history")
+    context = context_messages(state.get("summary", ""), state.get("history", []))
+    response = await query_medgemma(query, use_cache=use_cache, context=context)  # Expects a string
     return {"output_mental_health_specialist": response}
 
-def emergency_call_tool(state: GraphState) -> dict:
-    call_emergency()  # May trigger an external alert
+async def emergency_call_tool(state: GraphState) -> dict:
+    if state.get("dispatch_emergency") is False:
+        # nobody is placing a call (e.g. /ask/batch), so don't promise one
+        return {"output_emergency_specialist": (
+            "⚠️ If you are in danger right now, please call your local emergency number "
+            "or a crisis line. You're not alone — people there can help you right away."
+        )}
+    # The call is placed in the background; this reply goes out right away
+    if await emergency_dispatcher.escalate(state.get("session_id") or None):
+        return {"output_emergency_specialist": (
+            "⚠️ Please stay with me. I'm contacting someone who can help you right now. "
+            "You're not alone — help is on the way."
+        )}
     return {"output_emergency_specialist": (
-        "⚠️ Please stay with me. I'm contacting someone who can help you right now. "
+        "⚠️ Please stay with me. I've already contacted someone who can help you. "
         "You're not alone — help is on the way."
     )}
 
@@ -73,31 +195,36 @@ def find_nearby_therapists_by_location(state: GraphState) -> dict:
         )
     }
 
-def ask_health_specialist(state: GraphState) -> dict:
+async def ask_health_specialist(state: GraphState) -> dict:
     query = state['input'].content
-    response = query_doc(query)  # ✅ Pass string, not dict
+    use_cache = "emergency" not in state.get("next", []) and not state.get("history")
+    context = context_messages(state.get("summary", ""), state.get("history", []))
+    response = await query_doc(query, use_cache=use_cache, context=context, documents=state.get("documents"))  # ✅ Pass string, not dict
     return {"output_health_specialist": response}
 
-def analyze_medical_image(state: GraphState) -> dict:
+async def analyze_medical_image(state: GraphState) -> dict:
     base64_img = state.get("image_base64")
     if not base64_img:
         return {"output_image_analysis": "⚠️ No image provided."}
 
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4-vision-preview",
-            messages=[
-                {"role": "user", "content": [
-                    {"type": "text", "text": (
-                        "You're a medical assistant. Analyze this image (X-ray, skin, etc.) and provide insights."
-                    )},
-                    {"type": "image_url", "image_url": {
-                        "url": f"data:image/png;base64,{base64_img}"
-                    }}
-                ]}
-            ],
-            max_tokens=800
-        )
+        with trace_call("openai", "gpt-4o-vision") as span:
+            response = await get_vision_client().chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "user", "content": [
+                        {"type": "text", "text": (
+                            "You're a medical assistant. Analyze this image (X-ray, skin, etc.) and provide insights."
+                        )},
+                        {"type": "image_url", "image_url": {
+                            "url": f"data:image/png;base64,{base64_img}"
+                        }}
+                    ]}
+                ],
+                max_tokens=800
+            )
+            if response.usage:
+                span["tokens_in"], span["tokens_out"] = response.usage.prompt_tokens, response.usage.completion_tokens
         result = response.choices[0].message.content.strip()
         return {"output_image_analysis": result}
     except Exception as e:
@@ -105,45 +232,87 @@ def analyze_medical_image(state: GraphState) -> dict:
 
 # ---------------- COMBINE NODE ----------------
 
-def combine_response(state: GraphState) -> dict:
-    parts = []
-
-    if state.get("output_mental_health_specialist"):
-        parts.append("🧠 Mental Health:\n" + state["output_mental_health_specialist"])
-
-    if state.get("output_emergency_specialist"):
-        parts.append("🚨 Emergency:\n" + state["output_emergency_specialist"])
-
-    if state.get("output_near_doctor"):
-        parts.append("📍 Nearby Therapists:\n" + state["output_near_doctor"])
-
-    if state.get("output_health_specialist"):
-        parts.append("💊 Medical Info:\n" + state["output_health_specialist"])
-
-    if state.get("output_image_analysis"):
-        parts.append("🖼️ Image Insight:\n" + state["output_image_analysis"])
-
-    combined_prompt = (
-        "You are a supportive assistant. Combine the following into a clear, friendly response:\n\n" +
-        "\n\n".join(parts)
-    )
-
-    result = llm.invoke([HumanMessage(content=combined_prompt)])
-    return {"final_response": result.content.strip()}
+# (state key, heading, free text?) — static/templated outputs never need an LLM to merge them
+RESPONSE_PARTS = [
+    ("output_mental_health_specialist", "🧠 Mental Health:", True),
+    ("output_emergency_specialist", "🚨 Emergency:", False),
+    ("output_near_doctor", "📍 Nearby Therapists:", False),
+    ("output_health_specialist", "💊 Medical Info:", True),
+    ("output_image_analysis", "🖼️ Image Insight:", True),
+]
+
+def choose_combine_strategy(state: GraphState) -> str:
+    present = [free_text for key, _, free_text in RESPONSE_PARTS if state.get(key)]
+    if COMBINE_STRATEGY == "llm" or not present:
+        return "llm"
+    if len(present) == 1 and present[0]:
+        return "passthrough"
+    if sum(present) <= 1:
+        return "template"
+    return "llm"
+
+async def combine_response(state: GraphState) -> dict:
+    parts = [
+        heading + "\n" + state[key]
+        for key, heading, _ in RESPONSE_PARTS if state.get(key)
+    ]
+
+    strategy = choose_combine_strategy(state)
+    start = time.perf_counter()
+
+    if strategy == "passthrough":
+        final = next(state[key] for key, _, _ in RESPONSE_PARTS if state.get(key)).strip()
+    elif strategy == "template":
+        final = "\n\n".join(parts)
+    else:
+        combined_prompt = (
+            "You are a supportive assistant. Combine the following into a clear, friendly response:\n\n" +
+            "\n\n".join(parts)
+        )
+        result = await get_llm().ainvoke([HumanMessage(content=combined_prompt)])
+        final = result.content.strip()
+
+    metrics.observe("combine_seconds", time.perf_counter() - start, strategy=strategy)
+    return {"final_response": final}
+
+# ---------------- MEMORY NODE ----------------
+
+async def remember(state: GraphState) -> dict:
+    history = state.get("history", []) + [
+        {"role": "user", "content": state["input"].content},
+        {"role": "assistant", "content": state.get("final_response", "")},
+    ]
+    summary = state.get("summary", "")
+    older, window = split_window(history)
+    if older:
+        try:
+            summary = await summarize(get_llm(), summary, older)
+        except Exception as e:
+            # keep the window bounded even if the summary could not be refreshed
+            print(f"[memory] summarization failed: {e}")
+    return {"history": window, "summary": summary}
 
 # ---------------- GRAPH ----------------
 
-def build_mental_health_graph():
+def build_mental_health_graph(checkpointer=None):
+    """
+    With a checkpointer the graph keeps per-session memory: invoke it with
+    config={"configurable": {"thread_id": session_id}}.
+    """
     graph_builder = StateGraph(GraphState)
 
+    # Every node is timed under graph_node_seconds{node=...}
+    def add_node(name, fn):
+        graph_builder.add_node(name, traced_node(name, fn))
+
     # Nodes
-    graph_builder.add_node("router", router_node)
-    graph_builder.add_node("mental_specialist", ask_mental_health_specialist)
-    graph_builder.add_node("health_specialist", ask_health_specialist)
-    graph_builder.add_node("find_therapist", find_nearby_therapists_by_location)
-    graph_builder.add_node("emergency", emergency_call_tool)
-    graph_builder.add_node("vision_analysis", analyze_medical_image)
-    graph_builder.add_node("combine_response", combine_response)
+    add_node("router", router_node)
+    add_node("mental_specialist", ask_mental_health_specialist)
+    add_node("health_specialist", ask_health_specialist)
+    add_node("find_therapist", find_nearby_therapists_by_location)
+    add_node("emergency", emergency_call_tool)
+    add_node("vision_analysis", analyze_medical_image)
+    add_node("combine_response", combine_response)
 
     # Entry
     graph_builder.set_entry_point("router")
@@ -173,6 +342,11 @@ def build_mental_health_graph():
     graph_builder.add_edge("vision_analysis", "combine_response")
 
     # End graph
-    graph_builder.add_edge("combine_response", END)
-
-    return graph_builder.compile()
+    if checkpointer is None:
+        graph_builder.add_edge("combine_response", END)
+        return graph_builder.compile()
+
+    add_node("remember", remember)
+    graph_builder.add_edge("combine_response", "remember")
+    graph_builder.add_edge("remember", END)
+    return graph_builder.compile(checkpointer=checkpointer)
@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import shutil
+
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.vectorstores import FAISS
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from config import PDF_PATH, INDEX_PATH, INDEX_TYPE
+from retrieval import INDEX_TYPES, BM25_DIR, BM25Index, index_file, make_search_index, write_search_index
+
+# ----------------------------------------------
+# Offline FAISS index builder
+# ----------------------------------------------
+# Streams PDF pages, splits them, embeds new chunks in concurrent batches and
+# checkpoints the index as it goes. Every chunk is stored under the sha256 of
+# its text, so an interrupted build resumes where it stopped and adding a PDF
+# only embeds chunks the index has not seen. Finished PDFs are recorded by
+# content hash in manifest.json and skipped entirely on later runs.
+# Afterwards the search index of `index_type` and the BM25 index (see
+# retrieval.py) are derived from the flat index if missing or out of date.
+#
+#   python build_index.py --pdf data/new_reference.pdf
+#   python build_index.py --fake-embeddings --index data/faiss_index_test
+#   python build_index.py --index-type hnsw
+
+MANIFEST_NAME = "manifest.json"
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest(index_path: str) -> dict:
+    try:
+        with open(os.path.join(index_path, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"pdfs": {}}
+
+
+def save_checkpoint(vectorstore, index_path: str, manifest: dict):
+    # write to a side directory first so a crash mid-save never leaves a torn index
+    tmp_path = index_path + ".tmp"
+    vectorstore.save_local(tmp_path)
+    os.makedirs(index_path, exist_ok=True)
+    for name in os.listdir(tmp_path):
+        os.replace(os.path.join(tmp_path, name), os.path.join(index_path, name))
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    save_manifest(index_path, manifest)
+
+
+def save_manifest(index_path: str, manifest: dict):
+    manifest_tmp = os.path.join(index_path, MANIFEST_NAME + ".tmp")
+    with open(manifest_tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_tmp, os.path.join(index_path, MANIFEST_NAME))
+
+
+async def embed_with_retry(embeddings, texts: list[str], retries: int = 5, base_delay: float = 1.0) -> list[list[float]]:
+    for attempt in range(retries):
+        try:
+            return await embeddings.aembed_documents(texts)
+        except Exception as e:
+            if attempt == retries - 1:
+                raise
+            delay = base_delay * (2 ** attempt) * (0.5 + random.random())
+            print(f"[build_index] embedding batch failed ({e}); retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+
+def iter_chunks(pdf_path: str, splitter):
+    for page in PyPDFLoader(pdf_path).lazy_load():
+        for chunk in splitter.split_documents([page]):
+            yield chunk
+
+
+async def build_index(
+    pdf_paths: list[str],
+    index_path: str,
+    embeddings,
+    chunk_size: int = 500,
+    chunk_overlap: int = 50,
+    batch_size: int = 64,
+    concurrency: int = 4,
+    checkpoint_every: int = 20,
+    rebuild: bool = False,
+    index_type: str = INDEX_TYPE,
+):
+    """
+    Builds or extends the FAISS index at index_path and returns the vectorstore.
+    """
+    if rebuild:
+        shutil.rmtree(index_path, ignore_errors=True)
+
+    manifest = load_manifest(index_path)
+    splitter_config = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
+    if manifest.get("splitter", splitter_config) != splitter_config:
+        raise ValueError(
+            f"Index at {index_path} was built with {manifest['splitter']}; pass rebuild=True (--rebuild) to change it."
+        )
+    manifest["splitter"] = splitter_config
+
+    vectorstore = None
+    if os.path.exists(os.path.join(index_path, "index.faiss")):
+        vectorstore = FAISS.load_local(index_path, embeddings=embeddings, allow_dangerous_deserialization=True)
+    known = set(vectorstore.index_to_docstore_id.values()) if vectorstore else set()
+
+    splitter = RecursiveCharacterTextSplitter(**splitter_config)
+    semaphore = asyncio.Semaphore(concurrency)
+    batches_since_checkpoint = 0
+
+    async def embed_batch(batch):
+        async with semaphore:
+            return batch, await embed_with_retry(embeddings, [doc.page_content for _, doc in batch])
+
+    async def flush(window):
+        nonlocal vectorstore, batches_since_checkpoint
+        for batch, vectors in await asyncio.gather(*(embed_batch(b) for b in window)):
+            text_embeddings = [(doc.page_content, vector) for (_, doc), vector in zip(batch, vectors)]
+            metadatas = [doc.metadata for _, doc in batch]
+            ids = [chunk_id for chunk_id, _ in batch]
+            if vectorstore is None:
+                vectorstore = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+            else:
+                vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            batches_since_checkpoint += 1
+        if batches_since_checkpoint >= checkpoint_every:
+            save_checkpoint(vectorstore, index_path, manifest)
+            batches_since_checkpoint = 0
+            print(f"[build_index] checkpoint: {vectorstore.index.ntotal} chunks")
+
+    for pdf_path in pdf_paths:
+        pdf_hash = sha256_file(pdf_path)
+        if manifest["pdfs"].get(pdf_hash, {}).get("complete"):
+            print(f"[build_index] {pdf_path} already indexed, skipping")
+            continue
+        manifest["pdfs"][pdf_hash] = {"path": pdf_path, "complete": False}
+
+        batch, window, skipped = [], [], 0
+        for chunk in iter_chunks(pdf_path, splitter):
+            chunk_id = sha256_text(chunk.page_content)
+            if chunk_id in known:
+                skipped += 1
+                continue
+            known.add(chunk_id)
+            batch.append((chunk_id, chunk))
+            if len(batch) == batch_size:
+                window.append(batch)
+                batch = []
+            if len(window) == concurrency:
+                await flush(window)
+                window = []
+        if batch:
+            window.append(batch)
+        if window:
+            await flush(window)
+
+        manifest["pdfs"][pdf_hash]["complete"] = True
+        if vectorstore is not None:
+            save_checkpoint(vectorstore, index_path, manifest)
+            batches_since_checkpoint = 0
+        print(f"[build_index] {pdf_path} done ({skipped} chunks already indexed)")
+
+    if vectorstore is not None:
+        derive_search_index(vectorstore.index, index_path, index_type, manifest)
+        derive_bm25(vectorstore, index_path, manifest)
+    return vectorstore
+
+
+def derive_search_index(flat, index_path: str, index_type: str, manifest: dict):
+    """
+    Writes index.<type>.faiss from the flat index unless an up-to-date one
+    (same vector count) is already there.
+    """
+    if index_type == "flat":
+        return
+    built = manifest.setdefault("search_indexes", {})
+    if built.get(index_type) == flat.ntotal and os.path.exists(os.path.join(index_path, index_file(index_type))):
+        return
+    try:
+        index = make_search_index(flat, index_type)
+    except ValueError as e:
+        print(f"[build_index] not building the {index_type} index: {e}")
+        return
+    write_search_index(index, index_path, index_type)
+    built[index_type] = flat.ntotal
+    save_manifest(index_path, manifest)
+    print(f"[build_index] {index_type} index written ({flat.ntotal} vectors)")
+
+
+def derive_bm25(vectorstore, index_path: str, manifest: dict):
+    """
+    Writes the BM25 index over the same chunks, in FAISS position order,
+    unless an up-to-date one is already there.
+    """
+    ntotal = vectorstore.index.ntotal
+    built = manifest.setdefault("search_indexes", {})
+    if built.get("bm25") == ntotal and os.path.exists(os.path.join(index_path, BM25_DIR, "meta.json")):
+        return
+    texts = [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]).page_content for i in range(ntotal)]
+    BM25Index.build(texts).save(os.path.join(index_path, BM25_DIR))
+    built["bm25"] = ntotal
+    save_manifest(index_path, manifest)
+    print(f"[build_index] BM25 index written ({ntotal} chunks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or extend the FAISS index from medical PDFs.")
+    parser.add_argument("--pdf", action="append", help="PDF to index (repeatable); defaults to the GALE encyclopedia")
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--checkpoint-every", type=int, default=20, help="batches between checkpoints")
+    parser.add_argument("--rebuild", action="store_true", help="discard the existing index first")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=INDEX_TYPE, help="search index to derive from the flat one")
+    parser.add_argument("--fake-embeddings", action="store_true", help="deterministic local embeddings, no API calls")
+    args = parser.parse_args()
+
+    if args.fake_embeddings:
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        embeddings = DeterministicFakeEmbedding(size=1536)
+    else:
+        from tools import get_embedding_model
+        embeddings = get_embedding_model()
+
+    vectorstore = asyncio.run(build_index(
+        args.pdf or [PDF_PATH],
+        args.index,
+        embeddings,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        checkpoint_every=args.checkpoint_every,
+        rebuild=args.rebuild,
+        index_type=args.index_type,
+    ))
+    total = vectorstore.index.ntotal if vectorstore else 0
+    print(f"[build_index] index at {args.index} holds {total} chunks")
+
+
+if __name__ == "__main__":
+    main()
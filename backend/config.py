@@ -2,4 +2,141 @@ TWILIO_ACCOUNT_SID=""
 TWILIO_AUTH_TOKEN=""
 TWILIO_FROM_NUMBER=""
 EMERGENCY_CONTACT=""
-OPENAI_API_KEY=""
\ No newline at end of file
+OPENAI_API_KEY=""
+
+# PDF file and embedding path
+PDF_PATH=r"data\The_GALE_ENCYCLOPEDIA_of_MEDICINE_SECOND.pdf"
+INDEX_PATH=r"data/faiss_index_openai"
+
+# POST /reload-index only answers requests carrying this value in an
+# X-Admin-Token header; None turns the endpoint off
+ADMIN_TOKEN=None
+
+# Memory-map the FAISS index instead of reading it onto the heap, so all the
+# workers on a machine share one copy of it in the OS page cache
+FAISS_MMAP=True
+
+# FAISS index type the app searches: "flat" (exact), "fp16" (exact over float16
+# vectors, half the memory), "hnsw" (graph search) or "ivfpq" (inverted lists +
+# product quantization, smallest and lossy). build_index.py derives it from the
+# flat index; compare them with benchmarks/retrieval_benchmark.py
+INDEX_TYPE="flat"
+HNSW_M=32
+HNSW_EF_SEARCH=64
+IVF_NLIST=None
+IVF_NPROBE=16
+PQ_M=64
+PQ_NBITS=8
+
+# Retriever for the RAG answer: chunks per question, "similarity" or "mmr"
+# search, an optional relevance cutoff in [0, 1] (similarity search only) and
+# how many tokens of chunks may be stuffed into the prompt
+RETRIEVER_K=4
+RETRIEVER_SEARCH_TYPE="similarity"
+RETRIEVER_FETCH_K=20
+RETRIEVER_MMR_LAMBDA=0.5
+RETRIEVER_SCORE_THRESHOLD=None
+RETRIEVER_CONTEXT_TOKENS=2000
+
+# Hybrid retrieval: a BM25 index over the same chunks (built by build_index.py)
+# is searched alongside FAISS, RETRIEVER_FETCH_K results from each, and the two
+# rankings are merged by reciprocal rank fusion. Off until it is measured on the
+# real index: retrieval_benchmark.py --hybrid --index data/faiss_index_openai
+RETRIEVER_HYBRID=False
+RRF_K=60
+BM25_K1=1.2
+BM25_B=0.75
+
+# Local fast-path router: skip the GPT-4 routing call when it is this confident
+LOCAL_ROUTER_ENABLED=True
+LOCAL_ROUTER_MIN_CONFIDENCE=0.5
+
+# How combine_response merges specialist outputs: "auto" only calls the LLM when
+# there are several free-text parts, "llm" always does
+COMBINE_STRATEGY="auto"
+
+# Opt-in cache for specialist answers: exact match on the normalized prompt, plus
+# an embedding-similarity tier (set RESPONSE_CACHE_SIMILARITY=None to disable it)
+RESPONSE_CACHE_ENABLED=False
+RESPONSE_CACHE_MAX_ENTRIES=1000
+RESPONSE_CACHE_TTL_SECONDS=3600
+RESPONSE_CACHE_SIMILARITY=0.95
+
+# Per-backend timeouts for query_doc; whichever side finishes in time is still returned
+QUERY_DOC_RAG_TIMEOUT_SECONDS=30
+QUERY_DOC_OLLAMA_TIMEOUT_SECONDS=30
+
+# On-disk cache of OpenAI embeddings for chunks and queries; an entry is ~6 KB
+# for 1536-d vectors, so 200k entries is ~1.2 GB
+EMBEDDING_CACHE_ENABLED=True
+EMBEDDING_CACHE_PATH=r"data/embedding_cache.sqlite"
+EMBEDDING_CACHE_MAX_ENTRIES=200000
+
+# Local Ollama (MedGemma) backpressure: calls in flight, queued callers and how
+# long a caller may wait for a slot before it is turned away
+OLLAMA_HOST=None
+OLLAMA_MAX_IN_FLIGHT=2
+OLLAMA_MAX_QUEUE=32
+OLLAMA_QUEUE_TIMEOUT_SECONDS=15
+OLLAMA_KEEP_ALIVE="30m"
+
+# Vision uploads are shrunk to what GPT-4o actually looks at and re-encoded lossy
+VISION_MAX_LONG_SIDE=2048
+VISION_MAX_SHORT_SIDE=768
+VISION_IMAGE_FORMAT="JPEG"
+VISION_IMAGE_QUALITY=85
+IMAGE_WORKERS=4
+
+# Vision results are reused for identical images only; uploads within
+# VISION_CACHE_MAX_HASH_DISTANCE bits of a cached image's perceptual hash are
+# counted as near duplicates but still analyzed
+VISION_CACHE_MAX_ENTRIES=256
+VISION_CACHE_TTL_SECONDS=86400
+VISION_CACHE_MAX_HASH_DISTANCE=4
+
+# Server-side session memory: "memory", "sqlite" or "redis" checkpointer. Each
+# keeps only a session's latest state, for MEMORY_TTL_SECONDS after its last
+# turn; "memory" also holds at most MEMORY_MAX_SESSIONS sessions per worker.
+# Once recent turns pass MEMORY_WINDOW_MAX_TOKENS, the older ones are
+# summarized until MEMORY_WINDOW_TOKENS are left verbatim
+MEMORY_BACKEND="memory"
+MEMORY_SQLITE_PATH=r"data/sessions.sqlite"
+MEMORY_TTL_SECONDS=604800
+MEMORY_MAX_SESSIONS=10000
+MEMORY_WINDOW_TOKENS=1500
+MEMORY_WINDOW_MAX_TOKENS=3000
+
+# Add a Server-Timing header (per-node / per-call durations) to responses
+SERVER_TIMING_ENABLED=False
+
+# Emergency escalation: "twilio" places real calls, "log" only prints. A session
+# is called at most once per ESCALATION_DEDUP_SECONDS; failed calls are retried
+# with exponential backoff
+ESCALATION_TRANSPORT="twilio"
+ESCALATION_DEDUP_SECONDS=900
+ESCALATION_MAX_ATTEMPTS=5
+ESCALATION_RETRY_BASE_SECONDS=2
+
+# State shared by every worker of a deployment (response and vision caches,
+# emergency dedup window, rate-limit counters): "memory" keeps it per process,
+# "redis" keeps it in the Redis at REDIS_URL so several uvicorn workers or
+# nodes behave as one. Set MEMORY_BACKEND="redis" to share sessions too
+SHARED_STATE_BACKEND="memory"
+REDIS_URL="redis://localhost:6379/0"
+SHARED_STATE_PREFIX="medical-chatbot:"
+
+# Per-client limit on /ask* and /upload-image-openai requests in a fixed
+# window (None disables it); counted in the shared state above
+RATE_LIMIT_REQUESTS=None
+RATE_LIMIT_WINDOW_SECONDS=60
+
+# True: the worker starts serving /healthz at once and warms up (index, graph,
+# clients, Ollama) in the background, reporting on /readyz. False: startup
+# waits for warm-up to finish
+STARTUP_WARMUP_IN_BACKGROUND=True
+
+# /ask/batch: most messages per request, how many messages are answered at
+# once, and how many ambiguous messages share one routing prompt
+BATCH_MAX_MESSAGES=500
+BATCH_MAX_CONCURRENCY=8
+BATCH_ROUTING_CHUNK=25
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from metrics import metrics
+
+# ----------------------------------------------
+# Persistent embedding cache
+# ----------------------------------------------
+# Wraps any langchain Embeddings with an on-disk SQLite table of float32
+# vectors keyed by sha256(namespace, kind, text). Only the texts that miss are
+# sent to the wrapped model, in one batched call, so re-splitting the
+# encyclopedia with a different chunk size only pays for chunks that are new.
+# The async methods run the SQLite work in a thread, off the event loop. A
+# failing cache (e.g. the file locked by another worker) only costs the cache:
+# texts are embedded as if they had missed.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, underlying: Embeddings, path: str, namespace: str, max_entries: int = 200_000):
+        self.underlying = underlying
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(SCHEMA)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        # kept up to date by _store so inserts do not need a COUNT(*)
+        (self._entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+
+    def _key(self, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{kind}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self, keys: list[str]) -> dict:
+        found = {}
+        with self._lock:
+            try:
+                # stay well under SQLite's bound-parameter limit
+                for start in range(0, len(keys), 500):
+                    chunk = keys[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                    ).fetchall()
+                    found.update((key, np.frombuffer(blob, dtype=np.float32).tolist()) for key, blob in rows)
+                if found:
+                    now = time.time()
+                    self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, k) for k in found])
+                    self._conn.commit()
+            except sqlite3.Error as e:
+                # e.g. "database is locked" with several workers on one file: embed everything instead
+                self._failed("load", e)
+                return {}
+        return found
+
+    def _store(self, items: dict):
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes(), now) for key, vector in items.items()]
+                )
+                # an upper bound: some of these may have replaced rows another process wrote
+                self._entries += len(items)
+                if self._entries > self.max_entries:
+                    (count,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+                    # evict down to 90% so the next eviction is not one insert away
+                    keep = int(self.max_entries * 0.9)
+                    if count > self.max_entries:
+                        self._conn.execute(
+                            "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                            (count - keep,)
+                        )
+                        count = keep
+                    self._entries = count
+                self._conn.commit()
+            except sqlite3.Error as e:
+                # the fresh vectors are still returned, they are just not cached
+                self._failed("store", e)
+
+    def _failed(self, operation: str, error: Exception):
+        print(f"[embedding-cache] {operation} failed, treating it as a miss: {error}")
+        metrics.inc("embedding_cache_errors", operation=operation)
+        try:
+            self._conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _split(self, kind: str, texts: list[str]):
+        keys = [self._key(kind, text) for text in texts]
+        return self._partition(keys, texts, self._load(keys))
+
+    async def _asplit(self, kind: str, texts: list[str]):
+        keys = [self._key(kind, text) for text in texts]
+        return self._partition(keys, texts, await asyncio.to_thread(self._load, keys))
+
+    def _partition(self, keys: list[str], texts: list[str], cached: dict):
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        hits = len(texts) - sum(1 for key in keys if key not in cached)
+        self.hits += hits
+        self.misses += len(texts) - hits
+        metrics.inc("embedding_cache_requests", hits, result="hit")
+        metrics.inc("embedding_cache_requests", len(texts) - hits, result="miss")
+        return keys, cached, missing
+
+    def _merge(self, keys, cached, missing, vectors) -> list[list[float]]:
+        fresh = dict(zip(missing, vectors))
+        if fresh:
+            self._store(fresh)
+        cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    async def _amerge(self, keys, cached, missing, vectors) -> list[list[float]]:
+        fresh = dict(zip(missing, vectors))
+        if fresh:
+            await asyncio.to_thread(self._store, fresh)
+        cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, cached, missing = self._split("document", texts)
+        vectors = self.underlying.embed_documents(list(missing.values())) if missing else []
+        return self._merge(keys, cached, missing, vectors)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, cached, missing = await self._asplit("document", texts)
+        vectors = await self.underlying.aembed_documents(list(missing.values())) if missing else []
+        return await self._amerge(keys, cached, missing, vectors)
+
+    def embed_query(self, text: str) -> list[float]:
+        keys, cached, missing = self._split("query", [text])
+        vectors = [self.underlying.embed_query(text)] if missing else []
+        return self._merge(keys, cached, missing, vectors)[0]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        keys, cached, missing = await self._asplit("query", [text])
+        vectors = [await self.underlying.aembed_query(text)] if missing else []
+        return (await self._amerge(keys, cached, missing, vectors))[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
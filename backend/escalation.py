@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from metrics import metrics
+from shared_state import MemoryStore
+from tracing import trace_call
+
+# ----------------------------------------------
+# Emergency escalation dispatcher
+# ----------------------------------------------
+# The emergency node only enqueues an escalation and answers the user right
+# away; a background worker places the phone call, retrying with backoff.
+# A session that already escalated within dedup_seconds is not called again,
+# so repeated crisis messages in one conversation place one call. The dedup
+# window lives in `store` (see shared_state.py); with a shared store it holds
+# across workers, whichever of them the messages land on.
+
+TWIML = '<Response><Say voice="alice">Emergency. Please assist immediately.</Say></Response>'
+
+
+class TwilioTransport:
+    """
+    Places the call through one Twilio Client, created on first use and
+    reused after that. Pass `client` to substitute a fake.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, from_number: str, to_number: str, client=None):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.from_number = from_number
+        self.to_number = to_number
+        self.client = client
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self.client is None:
+                from twilio.rest import Client
+                self.client = Client(self.account_sid, self.auth_token)
+            return self.client
+
+    def place_call(self):
+        client = self._get_client()
+        with trace_call("twilio", "call"):
+            client.calls.create(to=self.to_number, from_=self.from_number, twiml=TWIML)
+
+
+class LogTransport:
+    """
+    Prints instead of calling anyone; for local development without Twilio.
+    """
+
+    def __init__(self):
+        self.placed = 0
+
+    def place_call(self):
+        self.placed += 1
+        print("[escalation] would place emergency call now")
+
+
+@dataclass
+class Escalation:
+    session_id: Optional[str]
+    created: float = field(default_factory=time.monotonic)
+    attempt: int = 0
+
+
+class EscalationDispatcher:
+    def __init__(
+        self,
+        transport,
+        dedup_seconds: float = 900,
+        max_attempts: int = 5,
+        retry_base_seconds: float = 2.0,
+        workers: int = 1,
+        store=None,
+    ):
+        self.transport = transport
+        self.dedup_seconds = dedup_seconds
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.workers = workers
+        self.store = store or MemoryStore(100_000, dedup_seconds)
+        self._queue = None
+        self._tasks = []
+        self._pending = 0
+        self._idle = None
+        self._loop = None
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._tasks and self._loop is loop:
+            return
+        # first use, or a new event loop (e.g. successive asyncio.run calls)
+        self._loop = loop
+        self._pending = 0
+        self._queue = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        # a fresh context, so the workers do not hold on to the first request's trace
+        self._tasks = [
+            asyncio.create_task(self._worker(), context=contextvars.Context()) for _ in range(self.workers)
+        ]
+
+    async def escalate(self, session_id: Optional[str] = None) -> bool:
+        """
+        Queues an emergency call and returns without waiting for it. Returns
+        False if this session already escalated within the dedup window.
+        """
+        if session_id is not None:
+            try:
+                first = await self.store.add(session_id, time.time(), self.dedup_seconds)
+            except Exception as e:
+                # a second call is better than none
+                print(f"[escalation] dedup store unavailable, calling anyway: {e}")
+                first = True
+            if not first:
+                metrics.inc("escalations", result="deduplicated")
+                return False
+
+        self._ensure_started()
+        self._pending += 1
+        self._idle.clear()
+        self._queue.put_nowait(Escalation(session_id))
+        metrics.inc("escalations", result="queued")
+        metrics.set("escalation_queue_depth", self._queue.qsize())
+        return True
+
+    def _finish(self):
+        self._pending -= 1
+        if self._pending == 0:
+            self._idle.set()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            metrics.set("escalation_queue_depth", self._queue.qsize())
+            job.attempt += 1
+            try:
+                await asyncio.to_thread(self.transport.place_call)
+            except Exception as e:
+                if job.attempt < self.max_attempts:
+                    delay = self.retry_base_seconds * (2 ** (job.attempt - 1)) * (0.5 + random.random())
+                    print(f"[escalation] call failed ({e}); retry {job.attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                    metrics.inc("escalations", result="retry")
+                    # re-queue later rather than sleeping, so other escalations are not held up
+                    asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, job)
+                    continue
+                print(f"[escalation] giving up after {job.attempt} attempts: {e}")
+                metrics.inc("escalations", result="failed")
+                # let the next crisis message in this session try again
+                if job.session_id is not None:
+                    try:
+                        await self.store.delete(job.session_id)
+                    except Exception as e:
+                        print(f"[escalation] could not clear dedup entry: {e}")
+                self._finish()
+                continue
+            metrics.inc("escalations", result="sent")
+            metrics.observe("escalation_seconds", time.monotonic() - job.created)
+            self._finish()
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Waits up to `timeout` for queued and retrying calls, then stops the workers.
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            print(f"[escalation] shutting down with {self._pending} call(s) not placed")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,214 @@
+import math
+import re
+from collections import Counter
+
+# ----------------------------------------------
+# Local fast-path router
+# ----------------------------------------------
+# Sits in front of the GPT-4 routing call. Tier 1 is a set of regexes for
+# signals we never want to get wrong (first-person crisis language, therapist
+# requests). Tier 2 is a nearest-centroid classifier over bag-of-words vectors
+# built from the seed examples below. Anything it is not sure about goes to
+# the LLM.
+
+ROUTES = {"mental_specialist", "health_specialist", "find_therapist", "emergency", "vision_analysis"}
+
+# First-person self-harm intent only. These skip the LLM and place a call, so
+# a pattern that also fires on ordinary questions ("signs of a stroke") costs
+# a real phone call.
+EMERGENCY_PATTERNS = [
+    r"\b(kill|hurt|harm|cut|hang|shoot|poison|starv)\w* (my ?self|myself)\b",
+    r"\b(i'?m|i am|i feel|feeling|been|thinking about|thoughts of|think about)\b[^.?!]{0,20}\bsuicid(e|al)\b",
+    r"\b(end|take) (it all|my (own )?life)\b",
+    r"\bi (really |just |only )?(want|wanna) to die\b",
+    r"\bdon'?t want to (live|be alive|wake up)\b",
+    r"\bi\b[^.?!]{0,30}\b(overdos(ed|ing)|od'?d)\b",
+    r"\bno reason to live\b",
+    r"\bbetter off (dead|without me)\b",
+    r"\bdisappear\w* (forever|and never)\b",
+]
+
+# Crisis-adjacent wording that is not first-person intent by itself (someone
+# else at risk, a means or a plan, "die" in any other phrasing). The local
+# tiers never answer these: the LLM decides whether it is an emergency.
+CRISIS_CUES = re.compile(
+    r"\bself[- ]?harm\w*|\b(cut|cutting)\b[^.?!]{0,15}\b(my|myself|arms?|wrists?|thighs?|legs?|skin)\b|"
+    r"\b(rope|noose|pills|lethal|doses?|suicid\w*|die|dying|goodbye)\b|"
+    r"\b(kill|hurt|harm)\w* (him|her|them)sel(f|ves)\b|\bend (it|things)\b|"
+    r"\bhopeless\b[^.?!]{0,40}\b(plan\w*|tonight|anymore)\b"
+)
+
+# Medical emergencies read the same as questions about them, so the LLM decides
+MEDICAL_EMERGENCY_TERMS = re.compile(
+    r"\b(can'?t|cannot) breathe\b|\bchest pains?\b|"
+    r"\b(unconscious|not breathing|collapsed|seizures?|strokes?|heart attacks?|overdos\w*)\b"
+)
+
+THERAPIST_PATTERNS = [
+    r"\b(therapist|counsel+or|psychologist|psychiatrist|counsel+ing)s?\b.*\b(near|nearby|close|around|in my (area|city)|local)\b",
+    r"\b(find|recommend|suggest|book|see|need|looking for)\b.*\b(therapist|counsel+or|psychologist|psychiatrist)s?\b",
+]
+
+HEALTH_TERMS = re.compile(
+    r"\b(pain\w*|ache\w*|headache\w*|migraine\w*|fever\w*|cough\w*|rash\w*|itch\w*|swell\w*|swollen|"
+    r"dizz\w*|lightheaded|nause\w*|vomit\w*|diarrh\w*|constipat\w*|bloat\w*|heartburn|reflux|"
+    r"infect\w*|sprain\w*|fractur\w*|bleed\w*|cholesterol|diabet\w*|anemi\w*|asthma|arthritis|"
+    r"blood pressure|symptom\w*|medicine\w*|medication\w*|ibuprofen|paracetamol|antibiotic\w*|"
+    r"throat|stomach|chest|knee\w*|ankle\w*|wrist\w*|joint\w*|ear|eyes?|skin|back|urin\w*|glands?)\b"
+)
+
+MENTAL_TERMS = re.compile(
+    r"\b(stress\w*|anxi\w*|panic\w*|depress\w*|sad\w*|lonel\w*|overthink\w*|worr\w*|nervous|"
+    r"guilt\w*|worthless|numb|motivat\w*|grie\w*|overwhelm\w*|burn(t|ed)? ?out|cry\w*|crie\w*|"
+    r"procrastinat\w*|irritat\w*|angry|anger|concentrat\w*|focus\w*|compar\w*|self[- ]esteem|"
+    r"broke up|break ?up|feel\w* down|hopeless|unmotivated|mood\w*|lonely|emotion\w*)\b"
+)
+
+SEED_EXAMPLES = {
+    "mental_specialist": [
+        "I feel so stressed about work lately",
+        "I am anxious all the time and can't relax",
+        "I feel lonely and nobody understands me",
+        "I keep overthinking everything at night",
+        "I can't focus on my studies anymore",
+        "I feel sad and unmotivated every day",
+        "my relationship ended and I feel empty",
+        "I get panic attacks before presentations",
+        "I am nervous about my exams",
+        "I feel overwhelmed and burnt out",
+        "I have no energy to do anything and feel hopeless about the future",
+        "I am angry all the time and snap at my family",
+        "I can't stop worrying about what people think of me",
+        "I feel like a failure compared to my friends",
+        "how do I deal with grief after losing my dad",
+        "I procrastinate and then feel guilty",
+        "I feel depressed and cry a lot",
+        "social situations make me really uncomfortable",
+        "my mind keeps racing and I can't sleep because of stress",
+        "I have low self esteem",
+    ],
+    "health_specialist": [
+        "I have a headache and a fever",
+        "my throat is sore and I have a cough",
+        "I have stomach pain after eating",
+        "what causes high blood pressure",
+        "I have a rash on my arm that itches",
+        "my knee hurts when I walk",
+        "what are the symptoms of diabetes",
+        "I have had diarrhea for two days",
+        "what medicine should I take for a cold",
+        "my back pain is getting worse",
+        "is it normal to feel dizzy when standing up",
+        "I have a runny nose and sneezing",
+        "what foods help with acid reflux",
+        "I twisted my ankle and it is swollen",
+        "how is asthma treated",
+        "I have a burning feeling when I urinate",
+        "my skin is dry and peeling",
+        "what is the treatment for migraine",
+        "I keep vomiting and feel nauseous",
+        "my joints are stiff in the morning, could it be arthritis",
+    ],
+    "emergency": [
+        "I want to end my life",
+        "I am thinking about killing myself",
+        "I don't want to be here anymore",
+        "I have pills and I am going to take them all",
+        "nobody would care if I disappeared forever",
+        "I am going to hurt myself tonight",
+        "I wrote a goodbye note",
+        "I can't go on living like this",
+    ],
+}
+
+_TOKEN_RE = re.compile(r"[a-z']+")
+_STOPWORDS = {
+    "i", "a", "an", "the", "and", "or", "is", "am", "are", "to", "of", "my", "me",
+    "it", "in", "on", "for", "so", "be", "do", "that", "this", "with", "at", "have",
+    "has", "had", "what", "how", "can", "feel",
+}
+
+
+def _features(text: str) -> Counter:
+    words = [w for w in _TOKEN_RE.findall(text.lower()) if w not in _STOPWORDS]
+    # crude stemming keeps "worrying"/"worried"/"worry" together
+    stems = [w[:5] for w in words]
+    feats = Counter(stems)
+    feats.update(a + "_" + b for a, b in zip(stems, stems[1:]))
+    return feats
+
+
+def _normalize(vec: dict) -> dict:
+    norm = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+    return {k: v / norm for k, v in vec.items()}
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class LocalRouter:
+    """
+    Regex tier, keyword tier and nearest-centroid tier. route() returns the
+    tool list and a confidence in [0, 1]; callers fall back to the LLM router
+    when the confidence is below their threshold.
+    """
+
+    def __init__(self, examples: dict = SEED_EXAMPLES, emergency_margin: float = 0.15):
+        self.emergency_patterns = [re.compile(p) for p in EMERGENCY_PATTERNS]
+        self.therapist_patterns = [re.compile(p) for p in THERAPIST_PATTERNS]
+        self.emergency_margin = emergency_margin
+        self.centroids = {}
+        for label, texts in examples.items():
+            centroid = Counter()
+            for text in texts:
+                centroid.update(_normalize(_features(text)))
+            self.centroids[label] = _normalize(centroid)
+
+    def scores(self, message: str) -> dict:
+        vec = _normalize(_features(message))
+        return {label: _cosine(vec, centroid) for label, centroid in self.centroids.items()}
+
+    def route(self, message: str, has_image: bool = False) -> tuple[list[str], float]:
+        text = message.lower()
+        extra = ["vision_analysis"] if has_image else []
+
+        if any(p.search(text) for p in self.emergency_patterns):
+            return ["emergency", "mental_specialist"] + extra, 1.0
+
+        if CRISIS_CUES.search(text):
+            return ["mental_specialist"] + extra, 0.0
+
+        if any(p.search(text) for p in self.therapist_patterns):
+            mental = ["mental_specialist"] if MENTAL_TERMS.search(text) else []
+            return ["find_therapist"] + mental + extra, 1.0
+
+        if MEDICAL_EMERGENCY_TERMS.search(text):
+            return ["health_specialist"] + extra, 0.0
+
+        scores = self.scores(message)
+        ranked = sorted(
+            ((label, score) for label, score in scores.items() if label != "emergency"),
+            key=lambda item: item[1], reverse=True
+        )
+        (best, best_score), (_, second_score) = ranked[0], ranked[1]
+
+        # anything that looks even remotely like crisis language goes to the LLM
+        if scores.get("emergency", 0.0) > 0 and scores["emergency"] >= best_score - self.emergency_margin:
+            return [best] + extra, 0.0
+
+        health = bool(HEALTH_TERMS.search(text))
+        mental = bool(MENTAL_TERMS.search(text))
+        if health and mental:
+            return ["mental_specialist", "health_specialist"] + extra, 0.6
+        if health:
+            return ["health_specialist"] + extra, 0.8
+        if mental:
+            return ["mental_specialist"] + extra, 0.8
+
+        return [best] + extra, best_score - second_score
+
+
+local_router = LocalRouter()
@@ -0,0 +1,84 @@
+import asyncio
+import base64
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+
+from config import VISION_MAX_LONG_SIDE, VISION_MAX_SHORT_SIDE, VISION_IMAGE_FORMAT, VISION_IMAGE_QUALITY, IMAGE_WORKERS
+
+# ----------------------------------------------
+# Image preprocessing for the vision model
+# ----------------------------------------------
+# GPT-4o never looks at more than 2048px on the long side and 768px on the
+# short side, so anything larger is only upload time and CPU. We shrink to
+# that box, re-encode lossy and drop EXIF/ICC metadata. PIL releases the GIL
+# while decoding, resizing and encoding, so a thread pool keeps this work off
+# the event loop without the cost of shipping bytes to another process.
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+# EXIF orientations that are a 90 degree turn, i.e. stored width is displayed height
+ROTATED_ORIENTATIONS = {5, 6, 7, 8}
+
+image_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image")
+
+
+class PreparedImage(NamedTuple):
+    base64: str
+    mime_type: str
+    dhash: int
+
+
+def target_size(width: int, height: int, max_long: int = VISION_MAX_LONG_SIDE, max_short: int = VISION_MAX_SHORT_SIDE) -> tuple[int, int]:
+    scale = min(1.0, max_long / max(width, height), max_short / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def dhash(image: Image.Image) -> int:
+    """
+    64-bit difference hash: survives re-encoding and resizing, so the same
+    picture uploaded twice in different formats hashes (almost) the same.
+    """
+    pixels = list(image.convert("L").resize((9, 8), Image.BILINEAR).getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return bits
+
+
+def prepare_image(contents: bytes, fmt: str = VISION_IMAGE_FORMAT, quality: int = VISION_IMAGE_QUALITY) -> PreparedImage:
+    """
+    Returns the base64 payload, its mime type and a perceptual hash. Raises
+    PIL.UnidentifiedImageError for anything that is not an image.
+    """
+    image = Image.open(BytesIO(contents))
+    width, height = image.size
+    # most phone photos are stored sideways with an EXIF orientation, and the
+    # box applies to the image as displayed
+    rotated = image.getexif().get(0x0112) in ROTATED_ORIENTATIONS
+    if rotated:
+        width, height = height, width
+    size = target_size(width, height)
+    # lets the JPEG decoder downscale by 1/2, 1/4 or 1/8 while decoding; it
+    # works on the stored pixels, so it gets the stored orientation
+    image.draft("RGB", size[::-1] if rotated else size)
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail(size, Image.LANCZOS, reducing_gap=3.0)
+
+    buffer = BytesIO()
+    if fmt == "PNG":
+        image.save(buffer, format=fmt, optimize=True)
+    else:
+        image.save(buffer, format=fmt, quality=quality, optimize=True)
+    # metadata is dropped because nothing is passed through to save()
+    return PreparedImage(base64.b64encode(buffer.getbuffer()).decode("ascii"), MIME_TYPES[fmt], dhash(image))
+
+
+async def prepare_image_async(contents: bytes) -> PreparedImage:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(image_executor, prepare_image, contents)
@@ -1,91 +1,447 @@
-from fastapi import FastAPI, UploadFile, File
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING, Optional
+import asyncio
+import math
+import secrets
+import threading
+import time
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from langchain_core.messages import HumanMessage
-from ai_agent import build_mental_health_graph
+from vision_cache import VisionCache, sha256_hex
+from tools import init_vectorstore, reload_vectorstore, retrieve_batch, ollama_pool, emergency_dispatcher, MEDGEMMA_MODEL
+from metrics import metrics
+from memory import open_checkpointer
+from shared_state import open_store, close_redis_clients
+from tracing import start_request, server_timing, trace_call, tracing_callback
 from config import OPENAI_API_KEY
-import openai
 from io import BytesIO
-from PIL import Image, UnidentifiedImageError
 import base64
+import json
 import uvicorn
-from openai import OpenAI
-from config import OPENAI_API_KEY
+from config import OPENAI_API_KEY, VISION_CACHE_MAX_ENTRIES, VISION_CACHE_TTL_SECONDS, VISION_CACHE_MAX_HASH_DISTANCE
+from config import SERVER_TIMING_ENABLED, STARTUP_WARMUP_IN_BACKGROUND, BATCH_MAX_MESSAGES, BATCH_MAX_CONCURRENCY
+from config import RATE_LIMIT_REQUESTS, RATE_LIMIT_WINDOW_SECONDS, ADMIN_TOKEN
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# The graph (LangGraph, langchain_openai), the OpenAI clients and PIL are
+# imported and built during warm-up or on first use rather than at import
+# time, so the worker binds its port and answers /healthz quickly.
+client = None
+graph = None
+session_graph = None
+close_checkpointer = None
+graphs_ready = None
+readiness = {"ready": False, "error": None, "degraded": [], "phases": {}}
+
+
+def get_client():
+    global client
+    if client is None:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return client
+
+
+_graph_lock = threading.Lock()
+
+
+def get_graph():
+    global graph
+    with _graph_lock:
+        if graph is None:
+            from ai_agent import build_mental_health_graph
+            graph = build_mental_health_graph()
+    return graph
+
+
+async def aget_graph():
+    # a request that arrives during warm-up waits for the graph in a thread, not on the event loop
+    return graph if graph is not None else await run_in_threadpool(get_graph)
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 # ---------- Init ----------
-app = FastAPI()
-openai.api_key = OPENAI_API_KEY
-graph = build_mental_health_graph()
+async def timed_phase(name: str, phase):
+    start = time.perf_counter()
+    try:
+        return await phase()
+    finally:
+        seconds = time.perf_counter() - start
+        readiness["phases"][name] = round(seconds, 3)
+        metrics.observe("warmup_seconds", seconds, phase=name)
+
+
+def load_clients():
+    # the heavy imports happen here, in a worker thread, so /healthz stays responsive
+    from ai_agent import get_llm, get_vision_client
+    import imaging  # loads PIL here rather than during the first upload
+    get_llm()
+    get_vision_client()
+    get_client()
+
+
+async def build_graphs():
+    global session_graph, close_checkpointer
+    await run_in_threadpool(get_graph)
+    # Requests with a session_id run on a graph that checkpoints its state per session
+    from ai_agent import build_mental_health_graph
+    checkpointer, close_checkpointer = await open_checkpointer()
+    session_graph = build_mental_health_graph(checkpointer=checkpointer)
+    graphs_ready.set()
+
+
+async def load_index():
+    # Load the FAISS index once per process instead of on every health query
+    await run_in_threadpool(init_vectorstore)
+
+
+async def warm_ollama():
+    # MedGemma being down degrades answers but should not keep the worker out of rotation
+    try:
+        await ollama_pool.warm(MEDGEMMA_MODEL)
+    except Exception as e:
+        readiness["degraded"].append("ollama")
+        print(f"[startup] could not warm {MEDGEMMA_MODEL}: {e}")
+
+
+async def warm_up():
+    """
+    Loads everything the first request would otherwise pay for; /readyz
+    reports ready once it has finished.
+    """
+    start = time.perf_counter()
+    try:
+        async def load_local():
+            # one after the other: parallel threads only fight over the import lock and the GIL
+            await timed_phase("clients", lambda: run_in_threadpool(load_clients))
+            await timed_phase("graph", build_graphs)
+            await timed_phase("index", load_index)
+
+        # the Ollama ping is network-bound, so it overlaps the local work
+        await asyncio.gather(load_local(), timed_phase("ollama", warm_ollama))
+        readiness["ready"] = True
+    except Exception as e:
+        readiness["error"] = f"{type(e).__name__}: {e}"
+        print(f"[startup] warm-up failed: {readiness['error']}")
+    finally:
+        graphs_ready.set()
+    readiness["phases"]["total"] = round(time.perf_counter() - start, 3)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global graphs_ready
+    graphs_ready = asyncio.Event()
+    warm_up_task = asyncio.create_task(warm_up())
+    if not STARTUP_WARMUP_IN_BACKGROUND:
+        await warm_up_task
+    yield
+    warm_up_task.cancel()
+    # give queued emergency calls a chance to go out before exiting
+    await emergency_dispatcher.stop()
+    if close_checkpointer is not None:
+        await close_checkpointer()
+    await close_redis_clients()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
 
+
+# ---------- Request Tracing ----------
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    spans = start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    total = time.perf_counter() - start
+    # label by route template so /upload-image-openai/{sha} stays one series
+    route = request.scope.get("route")
+    path = route.path if route is not None else "unmatched"
+    metrics.observe("http_request_seconds", total, method=request.method, path=path)
+    # streamed responses send headers first, so they only carry what ran before the body
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing(spans, total)
+    return response
+
+
+# ---------- Rate Limiting ----------
+# Fixed-window counters per client address, in the shared state so the limit
+# holds for the deployment rather than per worker. Behind a proxy, run uvicorn
+# with --proxy-headers so the address is the real client's.
+rate_limit_counters = open_store("rate_limit", ttl_seconds=RATE_LIMIT_WINDOW_SECONDS)
+RATE_LIMITED_PATHS = ("/ask", "/upload-image-openai")
+
+@app.middleware("http")
+async def rate_limit(request: Request, call_next):
+    if RATE_LIMIT_REQUESTS and request.url.path.startswith(RATE_LIMITED_PATHS):
+        now = time.time()
+        window = int(now // RATE_LIMIT_WINDOW_SECONDS)
+        client_host = request.client.host if request.client else "unknown"
+        try:
+            count = await rate_limit_counters.incr(f"{client_host}:{window}", RATE_LIMIT_WINDOW_SECONDS)
+        except Exception as e:
+            # an unreachable counter store should not take the API down with it
+            print(f"[rate-limit] counters unavailable, letting the request through: {e}")
+            count = 0
+        if count > RATE_LIMIT_REQUESTS:
+            metrics.inc("rate_limited")
+            retry_after = math.ceil((window + 1) * RATE_LIMIT_WINDOW_SECONDS - now)
+            return JSONResponse(
+                {"detail": "Too many requests."}, status_code=429, headers={"Retry-After": str(retry_after)}
+            )
+    return await call_next(request)
+
 # ---------- Text Query Endpoint ----------
 class Query(BaseModel):
     message: str
+    session_id: Optional[str] = None
+
+async def graph_for(query: Query) -> tuple:
+    """
+    Returns (graph, extra invoke kwargs) for the query. Session turns are
+    checkpointed once at the end rather than after every node.
+    """
+    if query.session_id and session_graph is None and graphs_ready is not None:
+        # a session turn arriving during warm-up waits for the checkpointing graph
+        await graphs_ready.wait()
+    # nodes inherit the callback, so every LLM call and retrieval inside is traced
+    config = {"callbacks": [tracing_callback]}
+    if query.session_id and session_graph is not None:
+        config["configurable"] = {"thread_id": query.session_id}
+        return session_graph, {"config": config, "durability": "exit"}
+    return await aget_graph(), {"config": config}
 
 @app.post("/ask")
 async def ask(query: Query):
     user_input = HumanMessage(content=query.message)
-    result = graph.invoke({"input": user_input})
+    runner, kwargs = await graph_for(query)
+    result = await runner.ainvoke({"input": user_input, "session_id": query.session_id or ""}, **kwargs)
     return {"response": result["final_response"]}
 
 
+# ---------- Streaming Text Query Endpoint ----------
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/ask/stream")
+async def ask_stream(query: Query):
+    """
+    Server-Sent Events version of /ask: a "node" event as each graph node
+    finishes, "token" events while combine_response is generating, then a
+    "done" event carrying the full response.
+    """
+    user_input = HumanMessage(content=query.message)
+    runner, kwargs = await graph_for(query)
+
+    async def events():
+        final_response = ""
+        try:
+            async for mode, chunk in runner.astream({"input": user_input, "session_id": query.session_id or ""}, stream_mode=["updates", "messages"], **kwargs):
+                if mode == "updates":
+                    for node, update in chunk.items():
+                        update = update or {}
+                        if node == "combine_response":
+                            final_response = update.get("final_response", "")
+                        yield sse_event("node", {"node": node, "next": update.get("next")})
+                else:
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") == "combine_response" and message.content:
+                        yield sse_event("token", {"text": message.content})
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+            return
+        yield sse_event("done", {"response": final_response})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# ---------- Batch Text Query Endpoint ----------
+class BatchQuery(BaseModel):
+    messages: list[str]
+
+@app.post("/ask/batch")
+async def ask_batch(batch: BatchQuery):
+    """
+    Answers many independent messages (no session memory). Routing is done
+    for the whole batch up front, the FAISS search for every health question
+    is one matrix search, and up to BATCH_MAX_CONCURRENCY messages are
+    answered at a time. Streams one JSON line per message, in input order.
+    No emergency call is placed from a batch: a message routed to the
+    emergency tier is answered with crisis-line advice and its line has
+    "emergency": true, for the caller to act on.
+    """
+    if len(batch.messages) > BATCH_MAX_MESSAGES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_MESSAGES} messages per batch.")
+
+    runner = await aget_graph()
+    from ai_agent import route_batch
+    routes = await route_batch(batch.messages)
+    documents = [None] * len(batch.messages)
+    health = [i for i, tools in enumerate(routes) if "health_specialist" in tools]
+    if health:
+        try:
+            found = await retrieve_batch([batch.messages[i] for i in health])
+            for i, docs in zip(health, found):
+                documents[i] = docs
+        except Exception as e:
+            # query_doc retrieves per question when it gets no documents
+            print(f"[batch] batched retrieval failed, retrieving per message: {e}")
+    metrics.inc("batch_messages", len(batch.messages))
+
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def answer(i: int) -> dict:
+        async with semaphore:
+            state = {
+                "input": HumanMessage(content=batch.messages[i]),
+                "routes": routes[i],
+                "documents": documents[i],
+                "dispatch_emergency": False,
+            }
+            emergency = "emergency" in routes[i]
+            try:
+                result = await runner.ainvoke(state, config={"callbacks": [tracing_callback]})
+                return {"index": i, "response": result["final_response"], "emergency": emergency}
+            except Exception as e:
+                return {"index": i, "error": str(e), "emergency": emergency}
+
+    tasks = [asyncio.create_task(answer(i)) for i in range(len(batch.messages))]
+
+    async def lines():
+        try:
+            # answers finish out of order; each line goes out once everything before it is done
+            for task in tasks:
+                yield json.dumps(await task) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# ---------- Index Admin Endpoint ----------
+@app.post("/reload-index")
+async def reload_index(request: Request):
+    # a reload re-reads the whole index and docstore, so not just anyone may trigger one
+    if ADMIN_TOKEN is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(request.headers.get("X-Admin-Token", "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+    vectorstore = await run_in_threadpool(reload_vectorstore)
+    return {"status": "reloaded", "vectors": vectorstore.index.ntotal}
+
+
+# ---------- Health Endpoints ----------
+@app.get("/healthz")
+async def healthz():
+    # liveness: the process is up and the event loop is responding
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz():
+    # readiness: warm-up has finished and the worker can take traffic
+    return JSONResponse(readiness, status_code=200 if readiness["ready"] else 503)
+
+
+# ---------- Stats Endpoint ----------
+@app.get("/stats")
+async def stats():
+    return metrics.snapshot()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 # ---------- Utility ----------
-def encode_image_to_base64(image: Image.Image) -> str:
+def encode_image_to_base64(image: "Image.Image") -> str:
     buffered = BytesIO()
     image.save(buffered, format="PNG")
     return base64.b64encode(buffered.getvalue()).decode("utf-8")
 
 
 # ---------- Vision Upload Endpoint ----------
+VISION_PROMPT = (
+    "You're a helpful assistant. Please analyze the uploaded medical image "
+    "and describe what patterns, textures, or visible details are noticeable. "
+    "Do not diagnose. Just describe relevant features you observe in the image and tell is there any reason to go and see doctor."
+)
+
+vision_cache = VisionCache(
+    VISION_CACHE_MAX_ENTRIES, VISION_CACHE_TTL_SECONDS, VISION_CACHE_MAX_HASH_DISTANCE,
+    store=open_store("vision", VISION_CACHE_MAX_ENTRIES * 5, VISION_CACHE_TTL_SECONDS),
+)
+
+
+@app.get("/upload-image-openai/{image_sha256}")
+async def cached_image_analysis(image_sha256: str):
+    """
+    Lets clients skip the upload: returns the earlier result for an image
+    whose raw bytes hash to image_sha256, or 404.
+    """
+    result = await vision_cache.lookup_raw(image_sha256.lower(), VISION_PROMPT)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Image not analyzed yet.")
+    return {"diagnosis": result}
 
 
 @app.post("/upload-image-openai")
 async def upload_image_openai(file: UploadFile = File(...)):
+    from imaging import prepare_image_async
+    from PIL import UnidentifiedImageError
+
     try:
         contents = await file.read()
+        raw_sha = sha256_hex(contents)
+        result = await vision_cache.lookup_raw(raw_sha, VISION_PROMPT)
+        if result is not None:
+            return {"diagnosis": result}
 
-        # Validate image
+        # Validate, downscale and re-encode off the event loop
         try:
-            image = Image.open(BytesIO(contents)).convert("RGB")
+            image = await prepare_image_async(contents)
         except UnidentifiedImageError:
             return {"error": "Uploaded file is not a valid image."}
 
-        # Encode as base64 for GPT-4 Vision
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        base64_img = base64.b64encode(buffer.getvalue()).decode("utf-8")
-        text_prompt = (
-            "You're a helpful assistant. Please analyze the uploaded medical image "
-            "and describe what patterns, textures, or visible details are noticeable. "
-            "Do not diagnose. Just describe relevant features you observe in the image and tell is there any reason to go and see doctor."
-        )
-        # GPT-4 Vision prompt
-        response = client.chat.completions.create(
-        model="gpt-4o",
-        messages=[
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": text_prompt},
-                    {"type": "image_url", "image_url": {
-                        "url": f"data:image/png;base64,{base64_img}"
-                    }}
-                ]
-            }
-        ],
-        max_tokens=800
-    )
+        async def analyze():
+            # GPT-4 Vision prompt
+            with trace_call("openai", "gpt-4o-vision") as span:
+                response = await get_client().chat.completions.create(
+                    model="gpt-4o",
+                    messages=[
+                        {
+                            "role": "user",
+                            "content": [
+                                {"type": "text", "text": VISION_PROMPT},
+                                {"type": "image_url", "image_url": {
+                                    "url": f"data:{image.mime_type};base64,{image.base64}"
+                                }}
+                            ]
+                        }
+                    ],
+                    max_tokens=800
+                )
+                if response.usage:
+                    span["tokens_in"], span["tokens_out"] = response.usage.prompt_tokens, response.usage.completion_tokens
+            return response.choices[0].message.content
 
-
-        result = response.choices[0].message.content
+        result = await vision_cache.get_or_compute(
+            raw_sha, sha256_hex(image.base64), image.dhash, VISION_PROMPT, analyze
+        )
         return {"diagnosis": result}
 
     except Exception as e:
@@ -0,0 +1,109 @@
+import os
+
+from langchain_core.messages import HumanMessage
+
+from config import MEMORY_BACKEND, MEMORY_SQLITE_PATH, MEMORY_WINDOW_TOKENS, SHARED_STATE_PREFIX
+from config import MEMORY_WINDOW_MAX_TOKENS, MEMORY_TTL_SECONDS, MEMORY_MAX_SESSIONS
+
+# ----------------------------------------------
+# Per-session conversation memory
+# ----------------------------------------------
+# The graph state carries `history` (recent turns as {"role", "content"}) and
+# `summary` (a rolling summary of everything older). Once the history passes
+# MEMORY_WINDOW_MAX_TOKENS, the newest turns that fit in MEMORY_WINDOW_TOKENS
+# stay verbatim and the rest are folded into the summary, so prompt size stays
+# bounded however long the conversation runs. State is persisted per session by a LangGraph
+# checkpointer (in-memory, SQLite, or Redis when several workers serve the
+# same sessions) that keeps only each session's latest checkpoint.
+
+SUMMARY_PROMPT = """You keep notes for a supportive mental and physical health assistant.
+Update the running summary of the conversation with the new turns below.
+Keep what matters for follow-up care: feelings, symptoms, duration, triggers,
+what was suggested and how the user responded. Stay under 150 words.
+
+Current summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting and needs no tokenizer
+    return len(text) // 4 + 1
+
+
+def split_window(
+    history: list[dict], budget: int = MEMORY_WINDOW_TOKENS, high_water: int = MEMORY_WINDOW_MAX_TOKENS
+) -> tuple[list[dict], list[dict]]:
+    """
+    Returns (older turns to summarize, newest turns that fit in the budget).
+    Nothing is summarized until the history passes high_water tokens, so a
+    long session pays for a summary every few turns rather than every turn.
+    """
+    if sum(estimate_tokens(turn["content"]) for turn in history) <= high_water:
+        return [], history
+    used, start = 0, len(history)
+    while start > 0:
+        cost = estimate_tokens(history[start - 1]["content"])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    return history[:start], history[start:]
+
+
+async def summarize(llm, summary: str, turns: list[dict]) -> str:
+    text = "\n".join(f"{turn['role']}: {turn['content']}" for turn in turns)
+    response = await llm.ainvoke([
+        HumanMessage(content=SUMMARY_PROMPT.format(summary=summary or "(none yet)", turns=text))
+    ])
+    return response.content.strip()
+
+
+def context_messages(summary: str, history: list[dict]) -> list[dict]:
+    """
+    Chat messages to put between the system prompt and the new user message.
+    """
+    messages = []
+    if summary:
+        messages.append({"role": "system", "content": "Earlier in this conversation: " + summary})
+    messages.extend({"role": turn["role"], "content": turn["content"]} for turn in history)
+    return messages
+
+
+async def open_checkpointer(backend: str = MEMORY_BACKEND):
+    """
+    Returns (checkpointer, close coroutine function).
+    """
+    if backend == "sqlite":
+        import aiosqlite
+        from sqlite_checkpointer import PrunedSqliteSaver
+
+        if os.path.dirname(MEMORY_SQLITE_PATH):
+            os.makedirs(os.path.dirname(MEMORY_SQLITE_PATH), exist_ok=True)
+        conn = await aiosqlite.connect(MEMORY_SQLITE_PATH)
+        saver = PrunedSqliteSaver(conn, ttl_seconds=MEMORY_TTL_SECONDS)
+        await saver.setup()
+        return saver, conn.close
+
+    if backend == "redis":
+        from redis_checkpointer import RedisCheckpointer
+        from shared_state import redis_client
+
+        saver = RedisCheckpointer(redis_client(), prefix=SHARED_STATE_PREFIX, ttl_seconds=MEMORY_TTL_SECONDS)
+
+        async def close():
+            # the client is shared with the other Redis stores; main.py closes it
+            pass
+
+        return saver, close
+
+    from memory_checkpointer import MemoryCheckpointer
+
+    async def close():
+        pass
+
+    return MemoryCheckpointer(MEMORY_MAX_SESSIONS, MEMORY_TTL_SECONDS), close
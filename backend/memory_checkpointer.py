@@ -0,0 +1,119 @@
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+from shared_state import TTLCache
+
+# ----------------------------------------------
+# Session checkpoints in process memory
+# ----------------------------------------------
+# The in-process counterpart of RedisCheckpointer: only the latest checkpoint
+# of each session (plus the pending writes against it) is kept, in a bounded
+# TTL + LRU map, so a long-running worker holds at most max_sessions sessions
+# and forgets each one ttl_seconds after its last turn. LangGraph's
+# InMemorySaver keeps every checkpoint of every session forever. Only the
+# async methods are implemented; the graph is only ever run with
+# ainvoke/astream.
+
+
+class MemoryCheckpointer(BaseCheckpointSaver):
+    def __init__(self, max_sessions: int = 10_000, ttl_seconds: float = 604800):
+        super().__init__()
+        self.sessions = TTLCache(max_sessions, ttl_seconds)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        saved = self.sessions.get((thread_id, checkpoint_ns))
+        if saved is None:
+            return None
+        checkpoint_id = saved["id"]
+        if get_checkpoint_id(config) not in (None, checkpoint_id):
+            # older checkpoints are not kept
+            return None
+
+        pending = []
+        for (task_id, _), typed in sorted(saved["writes"].items()):
+            channel, value = self.serde.loads_typed(typed)
+            pending.append((task_id, channel, value))
+
+        parent = saved["parent"]
+        return CheckpointTuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            self.serde.loads_typed(saved["checkpoint"]),
+            self.serde.loads_typed(saved["metadata"]),
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent}}
+            if parent else None,
+            pending,
+        )
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config is None or limit == 0:
+            return
+        latest = await self.aget_tuple(config)
+        if latest is None or before is not None:
+            return
+        if filter and any(latest.metadata.get(k) != v for k, v in filter.items()):
+            return
+        yield latest
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        # replacing the entry drops the parent and its pending writes, which are part of this checkpoint now
+        self.sessions.set((thread_id, checkpoint_ns), {
+            "id": checkpoint["id"],
+            "parent": config["configurable"].get("checkpoint_id") or "",
+            "checkpoint": self.serde.dumps_typed(checkpoint),
+            "metadata": self.serde.dumps_typed(get_checkpoint_metadata(config, metadata)),
+            "writes": {},
+        })
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        saved = self.sessions.get((thread_id, checkpoint_ns))
+        if saved is None or saved["id"] != config["configurable"]["checkpoint_id"]:
+            # writes against a checkpoint that is no longer the latest would never be read
+            return
+        # special channels (errors, interrupts) replace earlier writes, the rest are written once
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        for idx, (channel, value) in enumerate(writes):
+            field = (task_id, WRITES_IDX_MAP.get(channel, idx))
+            if replace or field not in saved["writes"]:
+                saved["writes"][field] = self.serde.dumps_typed((channel, value))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        for key, _ in self.sessions.items():
+            if key[0] == thread_id:
+                self.sessions.pop(key)
@@ -0,0 +1,121 @@
+import bisect
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# ----------------------------------------------
+# In-process counters and latency timers
+# ----------------------------------------------
+# Timers double as Prometheus histograms with these upper bounds (seconds)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def _format(key: tuple) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _prom_labels(labels, extra: str = "") -> str:
+    parts = [
+        f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in labels
+    ]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._timers = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            count, total, peak, buckets = self._timers.get(key, (0, 0.0, 0.0, None))
+            buckets = list(buckets or [0] * len(BUCKETS))
+            slot = bisect.bisect_left(BUCKETS, seconds)
+            if slot < len(BUCKETS):
+                buckets[slot] += 1
+            self._timers[key] = (count + 1, total + seconds, max(peak, seconds), buckets)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counters = {_format(k): v for k, v in self._counters.items()}
+            gauges = {_format(k): v for k, v in self._gauges.items()}
+            timers = {
+                _format(k): {
+                    "count": count,
+                    "total_seconds": round(total, 6),
+                    "avg_seconds": round(total / count, 6),
+                    "max_seconds": round(peak, 6),
+                }
+                for k, (count, total, peak, _) in self._timers.items()
+            }
+        return {"counters": counters, "gauges": gauges, "timers": timers}
+
+    def render_prometheus(self) -> str:
+        """
+        Prometheus text exposition: counters get a _total suffix, timers are
+        rendered as histograms.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            timers = sorted(self._timers.items())
+
+        lines, typed = [], set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            name = name if name.endswith("_total") else name + "_total"
+            declare(name, "counter")
+            lines.append(f"{name}{_prom_labels(labels)} {value}")
+        for (name, labels), value in gauges:
+            declare(name, "gauge")
+            lines.append(f"{name}{_prom_labels(labels)} {value}")
+        for (name, labels), (count, total, _, buckets) in timers:
+            declare(name, "histogram")
+            cumulative = 0
+            for bound, hits in zip(BUCKETS, buckets):
+                cumulative += hits
+                le = _prom_labels(labels, f'le="{bound}"')
+                lines.append(f"{name}_bucket{le} {cumulative}")
+            le = _prom_labels(labels, 'le="+Inf"')
+            lines.append(f"{name}_bucket{le} {count}")
+            lines.append(f"{name}_sum{_prom_labels(labels)} {total}")
+            lines.append(f"{name}_count{_prom_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+from metrics import metrics
+from tracing import add_span, trace_call
+
+# ----------------------------------------------
+# Shared, bounded access to the local Ollama server
+# ----------------------------------------------
+# A single MedGemma instance serves everyone, so we cap the calls in flight
+# and queue the rest. A request that cannot get a slot within queue_timeout,
+# or arrives while the queue is already full, fails fast with OllamaBusy
+# instead of slowing every other request down.
+
+class OllamaBusy(Exception):
+    pass
+
+
+class OllamaPool:
+    def __init__(
+        self,
+        host: str = None,
+        max_in_flight: int = 2,
+        max_queue: int = 32,
+        queue_timeout: float = 15.0,
+        keep_alive: str = "30m",
+        client=None,
+    ):
+        # one AsyncClient is one pooled httpx connection set, shared by all requests;
+        # created on first use so importing this module stays cheap
+        self.host = host
+        self._client = client
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.keep_alive = keep_alive
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._waiting = 0
+        self._in_flight = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            import ollama
+            self._client = ollama.AsyncClient(host=self.host)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _publish(self):
+        metrics.set("ollama_queue_depth", self._waiting)
+        metrics.set("ollama_in_flight", self._in_flight)
+
+    async def chat(self, **kwargs):
+        start = time.perf_counter()
+        if self._slots.locked():
+            if self._waiting >= self.max_queue:
+                metrics.inc("ollama_rejected", reason="queue_full")
+                raise OllamaBusy(f"Ollama queue is full ({self._waiting} waiting)")
+
+            self._waiting += 1
+            self._publish()
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                metrics.inc("ollama_rejected", reason="deadline")
+                raise OllamaBusy(f"No Ollama slot free within {self.queue_timeout}s")
+            finally:
+                self._waiting -= 1
+                self._publish()
+        else:
+            await self._slots.acquire()
+        queue_wait = time.perf_counter() - start
+        metrics.observe("ollama_queue_wait_seconds", queue_wait)
+        add_span("ollama.queue", queue_wait)
+
+        self._in_flight += 1
+        self._publish()
+        try:
+            with trace_call("ollama", "chat") as span:
+                response = await self.client.chat(keep_alive=self.keep_alive, **kwargs)
+                span["tokens_in"] = response.get("prompt_eval_count")
+                span["tokens_out"] = response.get("eval_count")
+            return response
+        finally:
+            self._in_flight -= 1
+            self._publish()
+            self._slots.release()
+
+    async def warm(self, model: str):
+        """
+        Loads the model into memory (an empty prompt generates nothing) and pins
+        it there for keep_alive, so the first user request is not a cold load.
+        """
+        await self.client.generate(model=model, prompt="", keep_alive=self.keep_alive)
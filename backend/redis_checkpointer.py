@@ -0,0 +1,144 @@
+from typing import Any, AsyncIterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+# ----------------------------------------------
+# Session checkpoints in Redis
+# ----------------------------------------------
+# A LangGraph checkpointer that keeps only the latest checkpoint of each
+# session (plus the pending writes against it), which is all /ask needs:
+# every worker reads and writes the same session, and nobody asks for an
+# older state. Each session is one hash that expires ttl_seconds after its
+# last turn. Only the async methods are implemented; the graph is only ever
+# run with ainvoke/astream.
+
+
+def _pack(typed: tuple[str, bytes]) -> bytes:
+    type_, data = typed
+    return type_.encode() + b"\n" + data
+
+
+def _unpack(raw: bytes) -> tuple[str, bytes]:
+    type_, data = raw.split(b"\n", 1)
+    return type_.decode(), data
+
+
+class RedisCheckpointer(BaseCheckpointSaver):
+    def __init__(self, client, prefix: str = "", ttl_seconds: int = 604800):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix + "session:"
+        self.ttl_seconds = ttl_seconds
+
+    def _key(self, thread_id: str, checkpoint_ns: str) -> str:
+        return f"{self.prefix}{thread_id}:{checkpoint_ns}"
+
+    def _writes_key(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> str:
+        return f"{self._key(thread_id, checkpoint_ns)}:writes:{checkpoint_id}"
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        saved = await self.client.hgetall(self._key(thread_id, checkpoint_ns))
+        if not saved:
+            return None
+        checkpoint_id = saved[b"id"].decode()
+        if get_checkpoint_id(config) not in (None, checkpoint_id):
+            # older checkpoints are not kept
+            return None
+
+        writes = await self.client.hgetall(self._writes_key(thread_id, checkpoint_ns, checkpoint_id))
+        pending = []
+        for field in sorted(writes, key=lambda f: (f.rsplit(b":", 1)[0], int(f.rsplit(b":", 1)[1]))):
+            channel, value = self.serde.loads_typed(_unpack(writes[field]))
+            pending.append((field.rsplit(b":", 1)[0].decode(), channel, value))
+
+        parent = saved.get(b"parent", b"").decode()
+        return CheckpointTuple(
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}},
+            self.serde.loads_typed(_unpack(saved[b"checkpoint"])),
+            self.serde.loads_typed(_unpack(saved[b"metadata"])),
+            {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": parent}}
+            if parent else None,
+            pending,
+        )
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        if config is None or limit == 0:
+            return
+        latest = await self.aget_tuple(config)
+        if latest is None or before is not None:
+            return
+        if filter and any(latest.metadata.get(k) != v for k, v in filter.items()):
+            return
+        yield latest
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent = config["configurable"].get("checkpoint_id") or ""
+        key = self._key(thread_id, checkpoint_ns)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "id": checkpoint["id"],
+                "parent": parent,
+                "checkpoint": _pack(self.serde.dumps_typed(checkpoint)),
+                "metadata": _pack(self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))),
+            })
+            pipe.expire(key, self.ttl_seconds)
+            if parent:
+                # the parent's pending writes are part of this checkpoint now
+                pipe.delete(self._writes_key(thread_id, checkpoint_ns, parent))
+            await pipe.execute()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        key = self._writes_key(thread_id, checkpoint_ns, config["configurable"]["checkpoint_id"])
+        # special channels (errors, interrupts) replace earlier writes, the rest are written once
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+        async with self.client.pipeline(transaction=True) as pipe:
+            for idx, (channel, value) in enumerate(writes):
+                field = f"{task_id}:{WRITES_IDX_MAP.get(channel, idx)}"
+                packed = _pack(self.serde.dumps_typed((channel, value)))
+                if replace:
+                    pipe.hset(key, field, packed)
+                else:
+                    pipe.hsetnx(key, field, packed)
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        keys = [key async for key in self.client.scan_iter(match=f"{self.prefix}{thread_id}:*")]
+        if keys:
+            await self.client.delete(*keys)
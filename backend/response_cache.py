@@ -0,0 +1,115 @@
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+
+from shared_state import MemoryStore, TTLCache
+from tracing import record_cache
+
+# ----------------------------------------------
+# Specialist response cache
+# ----------------------------------------------
+def normalize_prompt(prompt: str) -> str:
+    text = re.sub(r"\s+", " ", prompt.strip().lower())
+    return text.strip(" .!?")
+
+
+@dataclass
+class CacheLookup:
+    key: str
+    namespace: str
+    text: str
+    value: Optional[str] = None
+    vector: Any = None
+
+    @property
+    def hit(self) -> bool:
+        return self.value is not None
+
+
+class ResponseCache:
+    """
+    Two-tier cache for specialist answers. The exact tier is keyed on the
+    normalized prompt plus model and options; the semantic tier compares the
+    prompt embedding with cached ones in the same model/options namespace and
+    serves the closest answer above similarity_threshold.
+
+    Answers live in `store` (see shared_state.py), so workers sharing a store
+    share exact hits. The prompt embeddings stay in this process: a worker's
+    semantic tier covers the prompts it embedded itself.
+
+    Usage: lookup() first, and store() the fresh answer on a miss.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        embed: Optional[Callable[[str], Awaitable[list[float]]]] = None,
+        max_entries: int = 1000,
+        ttl_seconds: float = 3600,
+        similarity_threshold: Optional[float] = 0.95,
+        store=None,
+    ):
+        self.name = name
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.answers = store or MemoryStore(max_entries, ttl_seconds)
+        self.vectors = TTLCache(max_entries, ttl_seconds)
+
+    async def lookup(self, prompt: str, model: str, options: Optional[dict] = None) -> CacheLookup:
+        namespace = model + "|" + json.dumps(options or {}, sort_keys=True)
+        text = normalize_prompt(prompt)
+        key = hashlib.sha256((namespace + "|" + text).encode("utf-8")).hexdigest()
+        lookup = CacheLookup(key=key, namespace=namespace, text=text)
+
+        value = await self._get(key)
+        if value is not None:
+            lookup.value = value
+            record_cache(self.name, "hit_exact")
+            return lookup
+
+        if self.embed is not None and self.similarity_threshold is not None:
+            try:
+                vector = np.asarray(await self.embed(text), dtype=np.float32)
+                lookup.vector = vector / (np.linalg.norm(vector) or 1.0)
+            except Exception:
+                # a failing embedding backend only costs us the semantic tier
+                record_cache(self.name, "embed_error")
+                return lookup
+            best, best_score = None, self.similarity_threshold
+            for candidate_key, (candidate_namespace, vector) in self.vectors.items():
+                if candidate_namespace != namespace:
+                    continue
+                score = float(np.dot(lookup.vector, vector))
+                if score >= best_score:
+                    best, best_score = candidate_key, score
+            # the answer may have expired from a shared store before our vector did
+            value = await self._get(best) if best is not None else None
+            if value is not None:
+                lookup.value = value
+                record_cache(self.name, "hit_semantic")
+                return lookup
+
+        record_cache(self.name, "miss")
+        return lookup
+
+    async def _get(self, key: str) -> Optional[str]:
+        try:
+            return await self.answers.get(key)
+        except Exception:
+            # an unreachable shared store only costs us the cache
+            record_cache(self.name, "store_error")
+            return None
+
+    async def store(self, lookup: CacheLookup, response: str):
+        try:
+            await self.answers.set(lookup.key, response, self.ttl_seconds)
+        except Exception:
+            record_cache(self.name, "store_error")
+            return
+        if lookup.vector is not None:
+            self.vectors.set(lookup.key, (lookup.namespace, lookup.vector))
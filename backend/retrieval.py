@@ -0,0 +1,334 @@
+import asyncio
+import json
+import math
+import os
+import re
+import shutil
+from collections import Counter
+from typing import Any, Optional
+
+import faiss
+import numpy as np
+from langchain_core.vectorstores import VectorStoreRetriever
+
+from config import INDEX_TYPE, HNSW_M, HNSW_EF_SEARCH, IVF_NLIST, IVF_NPROBE, PQ_M, PQ_NBITS
+from config import RETRIEVER_K, RETRIEVER_SEARCH_TYPE, RETRIEVER_FETCH_K, RETRIEVER_MMR_LAMBDA
+from config import RETRIEVER_SCORE_THRESHOLD, RETRIEVER_CONTEXT_TOKENS
+from config import RETRIEVER_HYBRID, RRF_K, BM25_K1, BM25_B
+from memory import estimate_tokens
+
+# ----------------------------------------------
+# FAISS index types
+# ----------------------------------------------
+# index.faiss is always the exact flat index: build_index.py appends to it and
+# it is the recall baseline. The other types are derived from its vectors and
+# saved next to it as index.<type>.faiss, sharing index.pkl (the docstore),
+# since the vectors keep their positions. The app searches the INDEX_TYPE one.
+#
+#   flat    exact, 4 bytes per dimension
+#   fp16    exact over float16 vectors, 2 bytes per dimension
+#   hnsw    graph search; faster than flat at some recall cost, a bit more memory
+#   ivfpq   inverted lists + product quantization; PQ_M bytes per vector, lossy
+
+INDEX_TYPES = ("flat", "fp16", "hnsw", "ivfpq")
+
+# 8-bit PQ codebooks need ~39 training points for each of their 256 centroids
+IVFPQ_MIN_VECTORS = 10_000
+
+
+def index_file(index_type: str = INDEX_TYPE) -> str:
+    return "index.faiss" if index_type == "flat" else f"index.{index_type}.faiss"
+
+
+def factory_string(index_type: str, ntotal: int, nlist: Optional[int] = IVF_NLIST) -> str:
+    """
+    The faiss.index_factory description for an index type.
+    """
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "fp16":
+        return "SQfp16"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if index_type == "ivfpq":
+        if ntotal < IVFPQ_MIN_VECTORS:
+            raise ValueError(f"ivfpq needs at least {IVFPQ_MIN_VECTORS} vectors to train, the index has {ntotal}")
+        # ~4 * sqrt(n) lists, with at least 39 training points per list
+        nlist = nlist or max(1, min(int(4 * math.sqrt(ntotal)), ntotal // 39))
+        # "np": skip polysemous training, which is slow and only helps Hamming-filtered search
+        return f"IVF{nlist},PQ{PQ_M}x{PQ_NBITS}np"
+    raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+
+
+def make_search_index(flat, index_type: str, nlist: Optional[int] = IVF_NLIST, batch: int = 65536):
+    """
+    Builds an index of the given type holding the flat index's vectors, in
+    the same order.
+    """
+    if index_type == "flat":
+        return flat
+    index = faiss.index_factory(flat.d, factory_string(index_type, flat.ntotal, nlist), flat.metric_type)
+    if not index.is_trained:
+        # a few hundred points per centroid is plenty; more only slows training
+        sample = np.random.default_rng(0).choice(flat.ntotal, min(flat.ntotal, 100_000), replace=False)
+        index.train(np.vstack([flat.reconstruct(int(i)) for i in np.sort(sample)]))
+    for start in range(0, flat.ntotal, batch):
+        index.add(flat.reconstruct_n(start, min(batch, flat.ntotal - start)))
+    return index
+
+
+def set_search_params(index, index_type: str, ef_search: int = HNSW_EF_SEARCH, nprobe: int = IVF_NPROBE):
+    """
+    Applies the query-time knobs: efSearch for HNSW, nprobe for IVF.
+    """
+    params = faiss.ParameterSpace()
+    if index_type == "hnsw":
+        params.set_index_parameter(index, "efSearch", ef_search)
+    elif index_type == "ivfpq":
+        params.set_index_parameter(index, "nprobe", nprobe)
+        if RETRIEVER_SEARCH_TYPE == "mmr":
+            # MMR re-reads the candidates' vectors by id
+            faiss.extract_index_ivf(index).make_direct_map()
+
+
+def read_search_index(path: str, index_type: str = INDEX_TYPE, mmap: bool = False):
+    """
+    Reads index.<type>.faiss from path, falling back to the flat index if
+    that type has not been built yet. Returns (index, type actually loaded).
+    """
+    if index_type != "flat" and not os.path.exists(os.path.join(path, index_file(index_type))):
+        print(f"[index] {index_file(index_type)} not found in {path}; using the flat index "
+              f"(run build_index.py --index-type {index_type})")
+        index_type = "flat"
+    io_flags = 0
+    if mmap:
+        # IO_FLAG_MMAP maps IVF inverted lists, IO_FLAG_MMAP_IFC (faiss >= 1.9) flat
+        # codes; faiss rejects the two together on IVF indexes
+        io_flags = faiss.IO_FLAG_MMAP if index_type == "ivfpq" else getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+    index = faiss.read_index(os.path.join(path, index_file(index_type)), io_flags)
+    set_search_params(index, index_type)
+    return index, index_type
+
+
+def write_search_index(index, path: str, index_type: str):
+    target = os.path.join(path, index_file(index_type))
+    faiss.write_index(index, target + ".tmp")
+    os.replace(target + ".tmp", target)
+
+
+# ----------------------------------------------
+# BM25 sparse index
+# ----------------------------------------------
+# Dense retrieval is weak on exact drug names, conditions and abbreviations, so
+# a BM25 index over the same chunks (same positions as the FAISS vectors) is
+# searched alongside it. The BM25 weight of every (term, chunk) pair is
+# precomputed at build time, and the index is a handful of .npy arrays in
+# <index>/bm25/ that are memory-mapped on load:
+#
+#   terms.npy     sorted vocabulary (fixed-width bytes), searched with searchsorted
+#   offsets.npy   postings of term i are docs/weights[offsets[i]:offsets[i + 1]]
+#   docs.npy      chunk positions
+#   weights.npy   BM25 weight of the term in that chunk
+#
+# so a query is a few array slices and a scatter-add, however large the corpus.
+
+BM25_DIR = "bm25"
+BM25_MAX_TERM_LENGTH = 24
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from had has have he her his how i if in into is it its "
+    "me my no not of on or our she so than that the their them then there these they this to was we were "
+    "what when which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token for token in _TOKEN.findall(text.lower())
+        if token not in _STOPWORDS and len(token) <= BM25_MAX_TERM_LENGTH
+    ]
+
+
+class BM25Index:
+    def __init__(self, terms, offsets, docs, weights, chunks: int):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.weights = weights
+        self.chunks = chunks
+
+    @classmethod
+    def build(cls, texts: list[str], k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        counts = [Counter(tokenize(text)) for text in texts]
+        lengths = np.array([sum(c.values()) for c in counts], dtype=np.float32)
+        avg_length = float(lengths.mean()) if len(lengths) else 0.0
+        postings = {}
+        for position, c in enumerate(counts):
+            for term, tf in c.items():
+                postings.setdefault(term, []).append((position, tf))
+
+        vocabulary = sorted(postings)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in vocabulary])
+        docs = np.empty(offsets[-1], dtype=np.int32)
+        weights = np.empty(offsets[-1], dtype=np.float32)
+        for i, term in enumerate(vocabulary):
+            positions, tfs = zip(*postings[term])
+            start, end = offsets[i], offsets[i + 1]
+            tf = np.array(tfs, dtype=np.float32)
+            norm = k1 * (1 - b + b * lengths[list(positions)] / (avg_length or 1.0))
+            idf = math.log(1 + (len(texts) - len(positions) + 0.5) / (len(positions) + 0.5))
+            docs[start:end] = positions
+            weights[start:end] = idf * tf * (k1 + 1) / (tf + norm)
+        terms = np.array(vocabulary, dtype=f"S{BM25_MAX_TERM_LENGTH}")
+        return cls(terms, offsets, docs, weights, len(texts))
+
+    def save(self, path: str):
+        # write to a side directory first, like the FAISS checkpoints
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for name in ("terms", "offsets", "docs", "weights"):
+            np.save(os.path.join(tmp_path, name + ".npy"), getattr(self, name))
+        with open(os.path.join(tmp_path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"chunks": self.chunks}, f)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "BM25Index":
+        mode = "r" if mmap else None
+        arrays = [np.load(os.path.join(path, name + ".npy"), mmap_mode=mode) for name in ("terms", "offsets", "docs", "weights")]
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            chunks = json.load(f)["chunks"]
+        return cls(*arrays, chunks)
+
+    def search(self, query: str, k: int) -> list[int]:
+        """
+        Positions of the k best-scoring chunks, best first; chunks sharing no
+        term with the query are never returned.
+        """
+        wanted = np.array(sorted(set(tokenize(query))), dtype=self.terms.dtype)
+        if not len(wanted) or not self.chunks:
+            return []
+        found = np.searchsorted(self.terms, wanted)
+        scores = np.zeros(self.chunks, dtype=np.float32)
+        for term, i in zip(wanted, found):
+            if i < len(self.terms) and self.terms[i] == term:
+                start, end = self.offsets[i], self.offsets[i + 1]
+                scores[self.docs[start:end]] += self.weights[start:end]
+        k = min(k, self.chunks)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [int(i) for i in top if scores[i] > 0]
+
+
+def read_bm25(path: str, ntotal: int) -> Optional[BM25Index]:
+    """
+    The BM25 index saved with the FAISS index at path, or None if there is
+    none (or hybrid retrieval is off).
+    """
+    if not RETRIEVER_HYBRID:
+        return None
+    if not os.path.exists(os.path.join(path, BM25_DIR, "meta.json")):
+        print(f"[index] no BM25 index in {path}; retrieval is vector-only (run build_index.py)")
+        return None
+    bm25 = BM25Index.load(os.path.join(path, BM25_DIR))
+    if bm25.chunks != ntotal:
+        print(f"[index] BM25 index covers {bm25.chunks} of {ntotal} chunks; run build_index.py to refresh it")
+    return bm25
+
+
+def rrf_fuse(rankings: list[list], k: int = RRF_K) -> list:
+    """
+    Reciprocal rank fusion: each key scores sum(1 / (k + rank)) over the
+    rankings it appears in. Returns the keys, best first.
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def fuse_documents(vectorstore, dense: list, sparse: list[int], top_k: int) -> list:
+    """
+    Merges vector hits (Documents) and BM25 hits (chunk positions) into the
+    top_k Documents.
+    """
+    sparse_docs = [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]) for i in sparse]
+    # indexes saved by older LangChain versions have no Document.id
+    key = lambda doc: doc.id or doc.page_content
+    by_key = {key(doc): doc for doc in sparse_docs + dense}
+    fused = rrf_fuse([[key(doc) for doc in dense], [key(doc) for doc in sparse_docs]])[:top_k]
+    return [by_key[k] for k in fused]
+
+
+# ----------------------------------------------
+# Retriever
+# ----------------------------------------------
+def trim_to_budget(documents: list, max_tokens: Optional[int] = RETRIEVER_CONTEXT_TOKENS) -> list:
+    """
+    Keeps the best-ranked chunks that fit in max_tokens (always at least one),
+    so the "stuff" prompt stays bounded however large k is.
+    """
+    if not max_tokens:
+        return documents
+    kept, used = [], 0
+    for doc in documents:
+        cost = estimate_tokens(doc.page_content)
+        if kept and used + cost > max_tokens:
+            break
+        kept.append(doc)
+        used += cost
+    return kept
+
+
+class BudgetedRetriever(VectorStoreRetriever):
+    """
+    VectorStoreRetriever that, given a BM25 index, fuses its hits with the
+    vector hits, and drops the lowest-ranked chunks beyond max_tokens.
+    """
+
+    max_tokens: Optional[int] = None
+    bm25: Optional[Any] = None
+    top_k: int = RETRIEVER_K
+
+    def _get_relevant_documents(self, query, *, run_manager, **kwargs):
+        docs = super()._get_relevant_documents(query, run_manager=run_manager, **kwargs)
+        if self.bm25 is not None:
+            docs = fuse_documents(self.vectorstore, docs, self.bm25.search(query, RETRIEVER_FETCH_K), self.top_k)
+        return trim_to_budget(docs, self.max_tokens)
+
+    async def _aget_relevant_documents(self, query, *, run_manager, **kwargs):
+        if self.bm25 is None:
+            docs = await super()._aget_relevant_documents(query, run_manager=run_manager, **kwargs)
+            return trim_to_budget(docs, self.max_tokens)
+        docs, sparse = await asyncio.gather(
+            super()._aget_relevant_documents(query, run_manager=run_manager, **kwargs),
+            asyncio.to_thread(self.bm25.search, query, RETRIEVER_FETCH_K),
+        )
+        return trim_to_budget(fuse_documents(self.vectorstore, docs, sparse, self.top_k), self.max_tokens)
+
+
+def make_retriever(vectorstore, bm25: Optional[BM25Index] = None) -> BudgetedRetriever:
+    # with BM25 the vector side returns fetch_k candidates for the fusion
+    k = RETRIEVER_FETCH_K if bm25 is not None else RETRIEVER_K
+    if RETRIEVER_SEARCH_TYPE == "mmr":
+        search_type = "mmr"
+        search_kwargs = {"k": RETRIEVER_K, "fetch_k": RETRIEVER_FETCH_K, "lambda_mult": RETRIEVER_MMR_LAMBDA}
+    elif RETRIEVER_SCORE_THRESHOLD is not None:
+        search_type = "similarity_score_threshold"
+        search_kwargs = {"k": k, "score_threshold": RETRIEVER_SCORE_THRESHOLD}
+    else:
+        search_type = "similarity"
+        search_kwargs = {"k": k}
+    return BudgetedRetriever(
+        vectorstore=vectorstore,
+        search_type=search_type,
+        search_kwargs=search_kwargs,
+        max_tokens=RETRIEVER_CONTEXT_TOKENS,
+        bm25=bm25,
+        top_k=RETRIEVER_K,
+    )
@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from config import SHARED_STATE_BACKEND, REDIS_URL, SHARED_STATE_PREFIX
+
+# ----------------------------------------------
+# Bounded TTL + LRU map
+# ----------------------------------------------
+class TTLCache:
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_seconds: float = None):
+        with self._lock:
+            self._data[key] = (time.monotonic() + (ttl_seconds or self.ttl_seconds), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def incr(self, key, ttl_seconds: float = None) -> int:
+        # keeps the expiry the counter was created with
+        with self._lock:
+            item = self._data.get(key)
+            now = time.monotonic()
+            if item is None or item[0] < now:
+                item = (now + (ttl_seconds or self.ttl_seconds), 0)
+            self._data[key] = item = (item[0], item[1] + 1)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+            return item[1]
+
+    def pop(self, key):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[1] if item is not None else None
+
+    def items(self):
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (expires, v) in self._data.items() if expires >= now]
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ----------------------------------------------
+# State shared between workers
+# ----------------------------------------------
+# The pieces of state that must agree across uvicorn workers and nodes (the
+# response and vision caches, the emergency dedup window, rate-limit counters)
+# go through a small key/value store. MemoryStore keeps them in the process,
+# which is right for a single worker; RedisStore keeps them in one Redis so
+# every worker sees the same entries. Both have the same async interface and
+# values must be JSON-serializable. Session memory is a LangGraph
+# checkpointer instead, see memory.py.
+
+class MemoryStore:
+    """
+    In-process store. No method awaits anything, so on the event loop
+    add() is atomic as well.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_seconds: float = 3600):
+        self._data = TTLCache(max_entries, ttl_seconds)
+
+    async def get(self, key: str) -> Any:
+        return self._data.get(key)
+
+    async def set(self, key: str, value: Any, ttl_seconds: float = None):
+        self._data.set(key, value, ttl_seconds)
+
+    async def add(self, key: str, value: Any, ttl_seconds: float = None) -> bool:
+        """
+        Sets key only if it is not set yet; returns whether it did.
+        """
+        if self._data.get(key) is not None:
+            return False
+        self._data.set(key, value, ttl_seconds)
+        return True
+
+    async def delete(self, key: str):
+        self._data.pop(key)
+
+    async def incr(self, key: str, ttl_seconds: float = None) -> int:
+        """
+        Adds one to a counter and returns the new value. The TTL starts when
+        the counter is created and is not extended by later increments.
+        """
+        return self._data.incr(key, ttl_seconds)
+
+
+_redis_clients = {}
+
+
+def redis_client(url: str = REDIS_URL):
+    """
+    One redis.asyncio client (and so one connection pool) per URL for the
+    whole process, created on first use.
+    """
+    client = _redis_clients.get(url)
+    if client is None:
+        import redis.asyncio as redis
+        client = _redis_clients[url] = redis.Redis.from_url(url)
+    return client
+
+
+async def close_redis_clients():
+    for client in _redis_clients.values():
+        await client.aclose()
+    _redis_clients.clear()
+
+
+class RedisStore:
+    """
+    Store in Redis (or anything speaking its protocol). Keys are prefixed with
+    SHARED_STATE_PREFIX and the namespace; add() is SET NX and incr() is one
+    MULTI transaction, so both stay atomic across workers. Pass `client` to
+    use a stand-in such as fakeredis.
+    """
+
+    def __init__(self, namespace: str, ttl_seconds: float = 3600, client=None, url: str = REDIS_URL):
+        self.prefix = SHARED_STATE_PREFIX + namespace + ":"
+        self.ttl_seconds = ttl_seconds
+        self.url = url
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = redis_client(self.url)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def _ttl(self, ttl_seconds: Optional[float]) -> int:
+        return max(1, round(ttl_seconds or self.ttl_seconds))
+
+    async def get(self, key: str) -> Any:
+        raw = await self.client.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl_seconds: float = None):
+        await self.client.set(self.prefix + key, json.dumps(value), ex=self._ttl(ttl_seconds))
+
+    async def add(self, key: str, value: Any, ttl_seconds: float = None) -> bool:
+        return bool(await self.client.set(self.prefix + key, json.dumps(value), ex=self._ttl(ttl_seconds), nx=True))
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+    async def incr(self, key: str, ttl_seconds: float = None) -> int:
+        async with self.client.pipeline(transaction=True) as pipe:
+            # creating the key with its TTL first means INCR never leaves a counter that never expires
+            pipe.set(self.prefix + key, 0, ex=self._ttl(ttl_seconds), nx=True)
+            pipe.incr(self.prefix + key)
+            _, count = await pipe.execute()
+        return count
+
+
+def open_store(namespace: str, max_entries: int = 10_000, ttl_seconds: float = 3600, backend: str = SHARED_STATE_BACKEND):
+    """
+    The store for one kind of shared state, per SHARED_STATE_BACKEND.
+    max_entries only bounds the in-memory store; Redis evicts by TTL and its
+    own maxmemory policy.
+    """
+    if backend == "redis":
+        return RedisStore(namespace, ttl_seconds)
+    return MemoryStore(max_entries, ttl_seconds)
@@ -0,0 +1,69 @@
+import time
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+# ----------------------------------------------
+# Session checkpoints in SQLite
+# ----------------------------------------------
+# AsyncSqliteSaver keeps every checkpoint of every session. This one deletes
+# the older checkpoints (and their pending writes) of a session each time a
+# new one is saved, records when each session last changed, and every
+# prune_interval_seconds drops the sessions idle for more than ttl_seconds.
+
+
+class PrunedSqliteSaver(AsyncSqliteSaver):
+    def __init__(self, conn, ttl_seconds: float = 604800, prune_interval_seconds: float = 3600):
+        super().__init__(conn)
+        self.ttl_seconds = ttl_seconds
+        self.prune_interval_seconds = prune_interval_seconds
+        self._last_prune = 0.0
+
+    async def setup(self) -> None:
+        if self.is_setup:
+            return
+        await super().setup()
+        async with self.lock:
+            await self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_activity (thread_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)"
+            )
+            await self.conn.commit()
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        saved = await super().aput(config, checkpoint, metadata, new_versions)
+        thread_id = saved["configurable"]["thread_id"]
+        checkpoint_ns = saved["configurable"]["checkpoint_ns"]
+        now = time.time()
+        async with self.lock:
+            for table in ("checkpoints", "writes"):
+                await self.conn.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id != ?",
+                    (str(thread_id), checkpoint_ns, checkpoint["id"]),
+                )
+            await self.conn.execute(
+                "INSERT OR REPLACE INTO session_activity (thread_id, updated_at) VALUES (?, ?)", (str(thread_id), now)
+            )
+            if now - self._last_prune >= self.prune_interval_seconds:
+                self._last_prune = now
+                await self._prune_expired(now - self.ttl_seconds)
+            await self.conn.commit()
+        return saved
+
+    async def _prune_expired(self, cutoff: float):
+        expired = "SELECT thread_id FROM session_activity WHERE updated_at < ?"
+        for table in ("checkpoints", "writes"):
+            await self.conn.execute(f"DELETE FROM {table} WHERE thread_id IN ({expired})", (cutoff,))
+        await self.conn.execute("DELETE FROM session_activity WHERE updated_at < ?", (cutoff,))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await super().adelete_thread(thread_id)
+        async with self.lock:
+            await self.conn.execute("DELETE FROM session_activity WHERE thread_id = ?", (str(thread_id),))
+            await self.conn.commit()
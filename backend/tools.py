@@ -1,28 +1,84 @@
+import asyncio
 import os
-from langchain_community.vectorstores import FAISS
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain.chains import RetrievalQA
-from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from config import OPENAI_API_KEY, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM_NUMBER, EMERGENCY_CONTACT
-from twilio.rest import Client
+import pickle
+import threading
+from config import OPENAI_API_KEY, TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM_NUMBER, EMERGENCY_CONTACT, FAISS_MMAP
+from config import PDF_PATH, INDEX_PATH
+from config import RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_SIMILARITY
+from config import QUERY_DOC_RAG_TIMEOUT_SECONDS, QUERY_DOC_OLLAMA_TIMEOUT_SECONDS
+from config import RETRIEVER_K, RETRIEVER_FETCH_K, RETRIEVER_SCORE_THRESHOLD
+from metrics import metrics
+from tracing import trace_call
+from config import EMBEDDING_CACHE_ENABLED, EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_ENTRIES
+from config import OLLAMA_HOST, OLLAMA_MAX_IN_FLIGHT, OLLAMA_MAX_QUEUE, OLLAMA_QUEUE_TIMEOUT_SECONDS, OLLAMA_KEEP_ALIVE
+from config import ESCALATION_TRANSPORT, ESCALATION_DEDUP_SECONDS, ESCALATION_MAX_ATTEMPTS, ESCALATION_RETRY_BASE_SECONDS
+from response_cache import ResponseCache
+from shared_state import open_store
+from ollama_pool import OllamaPool, OllamaBusy
+from embedding_cache import CachedEmbeddings
+from escalation import EscalationDispatcher, LogTransport, TwilioTransport
 
-# PDF file and embedding path
-PDF_PATH = r"data\The_GALE_ENCYCLOPEDIA_of_MEDICINE_SECOND.pdf"
-INDEX_PATH = r"data/faiss_index_openai"
+# The OpenAI clients (and langchain_openai, the slowest import we have) are
+# created on first use; the app's warm-up phase calls these getters.
+embedding_model = None
+llm_model = None
+
+
+def get_embedding_model():
+    global embedding_model
+    if embedding_model is None:
+        from langchain_openai import OpenAIEmbeddings
+        model = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
+        if EMBEDDING_CACHE_ENABLED:
+            # Reuse vectors for chunks and queries we have embedded before
+            model = CachedEmbeddings(
+                model, EMBEDDING_CACHE_PATH, namespace=model.model, max_entries=EMBEDDING_CACHE_MAX_ENTRIES
+            )
+        embedding_model = model
+    return embedding_model
+
+
+def get_llm_model():
+    global llm_model
+    if llm_model is None:
+        from langchain_openai import ChatOpenAI
+        llm_model = ChatOpenAI(model="gpt-4", temperature=0.2, api_key=OPENAI_API_KEY)
+    return llm_model
 
-embedding_model = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY)
-llm_model = ChatOpenAI(model="gpt-4", temperature=0.2, api_key=OPENAI_API_KEY)
 
 # ----------------------------------------------
 # MedGemma-style response using GPT-4 fallback
 # ----------------------------------------------
-import ollama
+ollama_pool = OllamaPool(
+    host=OLLAMA_HOST,
+    max_in_flight=OLLAMA_MAX_IN_FLIGHT,
+    max_queue=OLLAMA_MAX_QUEUE,
+    queue_timeout=OLLAMA_QUEUE_TIMEOUT_SECONDS,
+    keep_alive=OLLAMA_KEEP_ALIVE,
+)
+
+MEDGEMMA_MODEL = 'alibayram/medgemma:4b'
+MEDGEMMA_OPTIONS = {
+    'num_predict': 350,  # Slightly higher for structured responses
+    'temperature': 0.7,  # Balanced creativity/accuracy
+    'top_p': 0.9        # For diverse but relevant responses
+}
+
+# Opt-in cache for specialist answers (never used for emergency-routed messages)
+response_cache = ResponseCache(
+    "specialist",
+    embed=(lambda text: get_embedding_model().aembed_query(text)) if RESPONSE_CACHE_SIMILARITY is not None else None,
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+    similarity_threshold=RESPONSE_CACHE_SIMILARITY,
+    store=open_store("responses", RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL_SECONDS),
+) if RESPONSE_CACHE_ENABLED else None
 
-def query_medgemma(prompt: str) -> str:
+async def query_medgemma(prompt: str, use_cache: bool = True, context: list[dict] = None) -> str:
     """
     Calls MedGemma model with a therapist personality profile.
     Returns responses as an empathic mental health professional.
+    `context` holds earlier turns of the conversation, if any.
     """
     system_prompt = """You are Doctor, a warm and experienced clinical psychologist. 
     Respond to patients with:
@@ -42,19 +98,27 @@ def query_medgemma(prompt: str) -> str:
     """
     
     try:
-        response = ollama.chat(
-            model='alibayram/medgemma:4b',
+        lookup = None
+        if use_cache and response_cache is not None:
+            lookup = await response_cache.lookup(prompt, model="query_medgemma:" + MEDGEMMA_MODEL, options=MEDGEMMA_OPTIONS)
+            if lookup.hit:
+                return lookup.value
+
+        response = await ollama_pool.chat(
+            model=MEDGEMMA_MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
+                *(context or []),
                 {"role": "user", "content": prompt}
             ],
-            options={
-                'num_predict': 350,  # Slightly higher for structured responses
-                'temperature': 0.7,  # Balanced creativity/accuracy
-                'top_p': 0.9        # For diverse but relevant responses
-            }
+            options=MEDGEMMA_OPTIONS
         )
-        return response['message']['content'].strip()
+        answer = response['message']['content'].strip()
+        if lookup is not None:
+            await response_cache.store(lookup, answer)
+        return answer
+    except OllamaBusy:
+        return "I'm talking with a lot of people right now, but your feelings matter. Please give me a moment and try again."
     except Exception as e:
         return f"I'm having technical difficulties, but I want you to know your feelings matter. Please try again shortly."
 
@@ -91,44 +155,171 @@ def query_medgemma(prompt: str) -> str:
 # ----------------------------------------------
 # Twilio emergency call tool
 # ----------------------------------------------
-def call_emergency():
-    client = Client(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN)
-    client.calls.create(
-        to=EMERGENCY_CONTACT,
-        from_=TWILIO_FROM_NUMBER,
-        twiml='<Response><Say voice="alice">Emergency. Please assist immediately.</Say></Response>'
-    )
+# Calls are placed in the background; the user's reply never waits on Twilio
+emergency_dispatcher = EscalationDispatcher(
+    TwilioTransport(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_FROM_NUMBER, EMERGENCY_CONTACT)
+    if ESCALATION_TRANSPORT == "twilio" else LogTransport(),
+    dedup_seconds=ESCALATION_DEDUP_SECONDS,
+    max_attempts=ESCALATION_MAX_ATTEMPTS,
+    retry_base_seconds=ESCALATION_RETRY_BASE_SECONDS,
+    store=open_store("escalations", ttl_seconds=ESCALATION_DEDUP_SECONDS),
+)
 
 
 # ----------------------------------------------
 # One-time embedding and PDF question handler
 # ----------------------------------------------
+# FAISS, RetrievalQA and the PDF/splitter stack are imported where they are
+# used, so importing this module (and starting the app) does not pay for them.
+def build_vectorstore():
+    # Normally done offline with `python build_index.py`; this is the first-run fallback
+    from build_index import build_index
+    return asyncio.run(build_index([PDF_PATH], INDEX_PATH, get_embedding_model()))
+
+
+def load_vectorstore(path: str = INDEX_PATH, mmap: bool = FAISS_MMAP):
+    """
+    Loads the saved index of type INDEX_TYPE (see retrieval.py). With
+    mmap=True the vectors are memory-mapped instead of copied onto the heap.
+    """
+    from langchain_community.vectorstores import FAISS
+    from retrieval import read_search_index
+
+    index, _ = read_search_index(path, mmap=mmap)
+    # same layout as FAISS.save_local writes
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(get_embedding_model(), index, docstore, index_to_docstore_id)
+
+
 def get_or_create_vectorstore():
     if os.path.exists(INDEX_PATH):
-        return FAISS.load_local(INDEX_PATH, embeddings=embedding_model, allow_dangerous_deserialization=True)
+        return load_vectorstore()
+    return build_vectorstore()
+
+
+# ----------------------------------------------
+# Process-wide vectorstore / QA chain registry
+# ----------------------------------------------
+# Loaded once (at app startup) and shared by every request. Readers only ever
+# grab the current references, so a reload swaps them without blocking queries
+# that are already running against the old index.
+_vectorstore = None
+_bm25 = None
+_qa_chain = None
+_vectorstore_lock = threading.Lock()
+
+
+def _make_qa_chain(vectorstore, bm25=None):
+    from langchain.chains import RetrievalQA
+    from retrieval import make_retriever
+    return RetrievalQA.from_chain_type(
+        llm=get_llm_model(),
+        retriever=make_retriever(vectorstore, bm25),
+        chain_type="stuff",
+        return_source_documents=False
+    )
+
 
-    loader = PyPDFLoader(PDF_PATH)
-    raw_docs = loader.load()
+def init_vectorstore():
+    global _vectorstore, _bm25, _qa_chain
+    from retrieval import read_bm25
+    with _vectorstore_lock:
+        if _vectorstore is None:
+            vectorstore = get_or_create_vectorstore()
+            _bm25 = read_bm25(INDEX_PATH, vectorstore.index.ntotal)
+            _qa_chain = _make_qa_chain(vectorstore, _bm25)
+            _vectorstore = vectorstore
+    return _vectorstore
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    split_docs = splitter.split_documents(raw_docs)
 
-    vectorstore = FAISS.from_documents(split_docs, embedding_model)
-    vectorstore.save_local(INDEX_PATH)
+def reload_vectorstore():
+    """
+    Re-reads the index from disk (e.g. after a rebuild) and atomically swaps it in.
+    """
+    global _vectorstore, _bm25, _qa_chain
+    from retrieval import read_bm25
+    vectorstore = load_vectorstore()
+    bm25 = read_bm25(INDEX_PATH, vectorstore.index.ntotal)
+    qa_chain = _make_qa_chain(vectorstore, bm25)
+    with _vectorstore_lock:
+        _vectorstore, _bm25, _qa_chain = vectorstore, bm25, qa_chain
     return vectorstore
 
 
-def query_doc(question: str) -> str:
+def get_vectorstore():
+    return _vectorstore if _vectorstore is not None else init_vectorstore()
+
+
+def get_qa_chain():
+    if _qa_chain is None:
+        init_vectorstore()
+    return _qa_chain
+
+
+# For request handlers: a request that arrives before warm-up has loaded the
+# index waits for it in a worker thread, not on the event loop
+async def aget_vectorstore():
+    return _vectorstore if _vectorstore is not None else await asyncio.to_thread(init_vectorstore)
+
+
+async def aget_qa_chain():
+    if _qa_chain is None:
+        await asyncio.to_thread(init_vectorstore)
+    return _qa_chain
+
+
+async def retrieve_batch(questions: list[str], k: int = RETRIEVER_K) -> list[list]:
+    """
+    Top-k chunks for every question, with one embeddings request and one
+    FAISS search over the whole query matrix instead of one per question.
+    Fuses in BM25 hits and applies the retriever's score cutoff and context
+    budget; MMR is not batched, so the vector side is a similarity search.
+    """
+    import numpy as np
+    from retrieval import fuse_documents, trim_to_budget
+
+    vectorstore = await aget_vectorstore()
+    bm25 = _bm25
+    vectors = np.asarray(await get_embedding_model().aembed_documents(questions), dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False):
+        import faiss
+        faiss.normalize_L2(vectors)
+    fetch_k = RETRIEVER_FETCH_K if bm25 is not None else k
+    with trace_call("faiss", "search_batch"):
+        distances, rows = await asyncio.to_thread(vectorstore.index.search, vectors, fetch_k)
+    sparse = [None] * len(questions)
+    if bm25 is not None:
+        with trace_call("bm25", "search_batch"):
+            sparse = await asyncio.to_thread(lambda: [bm25.search(q, RETRIEVER_FETCH_K) for q in questions])
+
+    relevance = vectorstore._select_relevance_score_fn()
+    results = []
+    for row_distances, row, row_sparse in zip(distances, rows, sparse):
+        docs = [
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[i])
+            for distance, i in zip(row_distances, row)
+            if i != -1 and (RETRIEVER_SCORE_THRESHOLD is None or relevance(distance) >= RETRIEVER_SCORE_THRESHOLD)
+        ]
+        if row_sparse is not None:
+            docs = fuse_documents(vectorstore, docs, row_sparse, k)
+        results.append(trim_to_budget(docs))
+    return results
+
+
+async def query_doc(question: str, use_cache: bool = True, context: list[dict] = None, documents: list = None) -> str:
+    """
+    `documents`, if given, are chunks already retrieved for the question (see
+    retrieve_batch); the RAG answer is then written from them without
+    searching the index again.
+    """
     try:
-        vectorstore = get_or_create_vectorstore()
-        retriever = vectorstore.as_retriever()
-
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm_model,
-            retriever=retriever,
-            chain_type="stuff",
-            return_source_documents=False
-        )
+        lookup = None
+        if use_cache and response_cache is not None:
+            lookup = await response_cache.lookup(question, model="query_doc:" + MEDGEMMA_MODEL, options=MEDGEMMA_OPTIONS)
+            if lookup.hit:
+                return lookup.value
+
         system_prompt = """You are Doctor, a warm and experienced one. 
         Respond to patients with:
 
@@ -145,25 +336,58 @@ def query_doc(question: str) -> str:
         - Mirror the user's language level
         - Always keep the conversation going by asking open ended questions to dive into the root cause of patients problem
         """
-        try:
-            response_ollama = ollama.chat(
-                model='alibayram/medgemma:4b',
+
+        async def ask_encyclopedia():
+            qa_chain = await aget_qa_chain()
+            if documents is not None:
+                response = await qa_chain.combine_documents_chain.ainvoke(
+                    {"input_documents": documents, "question": question}
+                )
+                return response["output_text"].strip()
+            response = await qa_chain.ainvoke({"query": question})  # returns dict with 'result'
+            return response["result"].strip()
+
+        async def ask_medgemma():
+            response_ollama = await ollama_pool.chat(
+                model=MEDGEMMA_MODEL,
                 messages=[
                     {"role": "system", "content": system_prompt},
+                    *(context or []),
                     {"role": "user", "content": question}
                 ],
-                options={
-                    'num_predict': 350,  # Slightly higher for structured responses
-                    'temperature': 0.7,  # Balanced creativity/accuracy
-                    'top_p': 0.9        # For diverse but relevant responses
-                }
+                options=MEDGEMMA_OPTIONS
             )
-        except Exception as e:
-            return f"I'm having technical difficulties, but I want you to know your feelings matter. Please try again shortly."
-            
+            return response_ollama['message']['content'].strip()
+
+        # The two backends are independent: run them side by side and keep
+        # whichever answers arrive in time
+        results = await asyncio.gather(
+            asyncio.wait_for(ask_encyclopedia(), QUERY_DOC_RAG_TIMEOUT_SECONDS),
+            asyncio.wait_for(ask_medgemma(), QUERY_DOC_OLLAMA_TIMEOUT_SECONDS),
+            return_exceptions=True
+        )
+        answers = []
+        for backend, result in zip(("rag", "medgemma"), results):
+            if isinstance(result, BaseException):
+                if isinstance(result, asyncio.TimeoutError):
+                    reason = "timeout"
+                elif isinstance(result, OllamaBusy):
+                    reason = "busy"
+                else:
+                    reason = "error"
+                metrics.inc("backend_failures", backend=backend, reason=reason)
+                print(f"[query_doc {backend} {reason}] {result!r}")
+            elif result:
+                answers.append(result)
+
+        if not answers:
+            return "⚠️ Sorry, I couldn't retrieve information from the document right now."
 
-        response = qa_chain.invoke({"query": question})  # returns dict with 'result'
-        return response["result"].strip()+response_ollama['message']['content'].strip()
+        answer = "\n\n".join(answers)
+        # only complete answers are worth serving again
+        if lookup is not None and len(answers) == len(results):
+            await response_cache.store(lookup, answer)
+        return answer
     except Exception as e:
         print(f"[query_doc error] {e}")
         return "⚠️ Sorry, I couldn't retrieve information from the document right now."
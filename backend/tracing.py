@@ -0,0 +1,201 @@
+import functools
+import inspect
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import metrics
+
+# ----------------------------------------------
+# Per-node and per-call tracing
+# ----------------------------------------------
+# Every graph node and every external call (OpenAI, Ollama, FAISS retrieval,
+# Twilio) lands in the process metrics:
+#
+#   graph_node_seconds{node}                    wall time per LangGraph node
+#   external_call_seconds{service,operation}    wall time per outbound call
+#   external_call_errors{service,operation}
+#   llm_tokens{service,operation,direction}     tokens in / out where reported
+#
+# and, while a request is being served, in that request's span list, which
+# main.py turns into a Server-Timing header.
+
+_request_spans: ContextVar[Optional[list]] = ContextVar("request_spans", default=None)
+
+
+def start_request() -> list:
+    """
+    Starts collecting spans for the current request and returns the list.
+    Tasks and threads spawned from here copy the context, so they append to
+    the same list.
+    """
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def add_span(name: str, seconds: float = None, desc: str = None):
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds, desc))
+
+
+def record_call(service: str, operation: str, seconds: float, ok: bool = True, tokens_in: int = None, tokens_out: int = None):
+    metrics.observe("external_call_seconds", seconds, service=service, operation=operation)
+    if not ok:
+        metrics.inc("external_call_errors", service=service, operation=operation)
+    if tokens_in:
+        metrics.inc("llm_tokens", tokens_in, service=service, operation=operation, direction="in")
+    if tokens_out:
+        metrics.inc("llm_tokens", tokens_out, service=service, operation=operation, direction="out")
+    add_span(f"{service}.{operation}", seconds)
+
+
+def record_cache(cache: str, result: str):
+    metrics.inc("cache_requests", cache=cache, result=result)
+    add_span("cache." + cache, desc=result)
+
+
+@contextmanager
+def trace_call(service: str, operation: str):
+    """
+    Times one outbound call. The caller may fill in span["tokens_in"] and
+    span["tokens_out"] from the response.
+    """
+    span = {"tokens_in": None, "tokens_out": None}
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield span
+        ok = True
+    finally:
+        record_call(service, operation, time.perf_counter() - start, ok, span["tokens_in"], span["tokens_out"])
+
+
+def traced_node(name: str, fn):
+    """
+    Wraps a graph node so its wall time is recorded under graph_node_seconds.
+    """
+    def record(start: float, ok: bool):
+        seconds = time.perf_counter() - start
+        metrics.observe("graph_node_seconds", seconds, node=name)
+        if not ok:
+            metrics.inc("graph_node_errors", node=name)
+        add_span("node." + name, seconds)
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(state):
+            start, ok = time.perf_counter(), False
+            try:
+                result = await fn(state)
+                ok = True
+                return result
+            finally:
+                record(start, ok)
+    else:
+        @functools.wraps(fn)
+        def wrapper(state):
+            start, ok = time.perf_counter(), False
+            try:
+                result = fn(state)
+                ok = True
+                return result
+            finally:
+                record(start, ok)
+    return wrapper
+
+
+class TracingCallback(BaseCallbackHandler):
+    """
+    LangChain callback for the calls made through LangChain objects: every
+    chat model call (router, combiner, summarizer, RetrievalQA's GPT-4) and
+    every FAISS retrieval. Pass it in the graph's config so nodes inherit it.
+    """
+
+    # run on the event loop, so the request's context (and span list) is visible
+    run_inline = True
+
+    def __init__(self):
+        self._started = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, metadata=None, **kwargs):
+        params = invocation_params or {}
+        model = params.get("model_name") or params.get("model") or (serialized or {}).get("name", "llm")
+        # the router, combiner and RetrievalQA all use gpt-4; the node tells them apart
+        self._started[run_id] = ("openai", _operation(model, metadata), time.perf_counter())
+
+    def on_llm_start(self, serialized, prompts, *, run_id, invocation_params=None, metadata=None, **kwargs):
+        self.on_chat_model_start(serialized, None, run_id=run_id, invocation_params=invocation_params, metadata=metadata)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return
+        service, operation, start = started
+        tokens_in, tokens_out = _token_usage(response)
+        record_call(service, operation, time.perf_counter() - start, True, tokens_in, tokens_out)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            service, operation, start = started
+            record_call(service, operation, time.perf_counter() - start, ok=False)
+
+    def on_retriever_start(self, serialized, query, *, run_id, metadata=None, **kwargs):
+        self._started[run_id] = ("faiss", _operation("retrieve", metadata), time.perf_counter())
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs):
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            service, operation, start = started
+            record_call(service, operation, time.perf_counter() - start)
+
+    def on_retriever_error(self, error, *, run_id, **kwargs):
+        self.on_llm_error(error, run_id=run_id)
+
+
+def _operation(name: str, metadata: Optional[dict]) -> str:
+    node = (metadata or {}).get("langgraph_node")
+    return f"{node}.{name}" if node else name
+
+
+def _token_usage(response) -> tuple:
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+    # streamed calls report usage on the message instead
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                return metadata.get("input_tokens"), metadata.get("output_tokens")
+    return None, None
+
+
+tracing_callback = TracingCallback()
+
+
+# ----------------------------------------------
+# Server-Timing header
+# ----------------------------------------------
+def server_timing(spans: list, total: float) -> str:
+    """
+    Renders the request's spans as a Server-Timing header value. Repeated
+    spans (e.g. two Ollama calls) are summed; spans without a duration become
+    desc-only entries such as cache results.
+    """
+    durations, notes = {}, []
+    for name, seconds, desc in spans:
+        name = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+        if seconds is None:
+            notes.append(f'{name};desc="{desc}"')
+        else:
+            durations[name] = durations.get(name, 0.0) + seconds
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries + notes)
@@ -0,0 +1,118 @@
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Optional
+
+from shared_state import MemoryStore, TTLCache
+from tracing import record_cache
+
+# ----------------------------------------------
+# Vision analysis dedup cache
+# ----------------------------------------------
+# Streamlit re-posts the same image on every rerun. Results are keyed on the
+# sha256 of the normalized (resized, re-encoded) image plus the prompt, and
+# the sha256 of the raw upload is remembered too so clients can ask for a
+# result by hash before uploading anything. A result is only ever served for
+# the exact same pixels: a perceptual hash cannot tell apart two X-rays that
+# differ by one nodule, so near matches are only counted (cache result
+# "miss_near_duplicate") to show how often a picture arrives re-encoded. Identical uploads that arrive
+# while the first one is still at the vision API wait for that call instead
+# of starting their own.
+#
+# Results and the raw-hash index live in `store` (see shared_state.py) and so
+# are shared by the workers using the same store. The perceptual hashes and
+# the in-flight calls are per process.
+
+def sha256_hex(data) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+class VisionCache:
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 86400, max_hash_distance: int = 4, store=None):
+        # one result plus up to four raw uploads pointing at it
+        self.store = store or MemoryStore(max_entries * 5, ttl_seconds)
+        self.ttl_seconds = ttl_seconds
+        self.hashes = TTLCache(max_entries, ttl_seconds)
+        self.max_hash_distance = max_hash_distance
+        self._inflight = {}
+
+    @staticmethod
+    def _key(image_sha: str, prompt: str) -> str:
+        return image_sha + ":" + sha256_hex(prompt)[:16]
+
+    async def _get(self, key: str) -> Optional[str]:
+        try:
+            return await self.store.get(key)
+        except Exception:
+            # an unreachable shared store only costs us the cache
+            record_cache("vision", "store_error")
+            return None
+
+    async def _set(self, key: str, value: str):
+        try:
+            await self.store.set(key, value, self.ttl_seconds)
+        except Exception:
+            record_cache("vision", "store_error")
+
+    async def _result(self, key: Optional[str]) -> Optional[str]:
+        return await self._get("result:" + key) if key else None
+
+    async def _remember_raw(self, raw_key: str, key: str):
+        await self._set("raw:" + raw_key, key)
+
+    async def lookup_raw(self, raw_sha: str, prompt: str) -> Optional[str]:
+        key = await self._get("raw:" + self._key(raw_sha, prompt))
+        result = await self._result(key)
+        if result is not None:
+            record_cache("vision", "hit_raw")
+        return result
+
+    def _has_near_duplicate(self, dhash: int, prompt_hash: str) -> bool:
+        return any(
+            key.endswith(prompt_hash) and bin(other ^ dhash).count("1") <= self.max_hash_distance
+            for key, other in self.hashes.items()
+        )
+
+    async def get_or_compute(
+        self,
+        raw_sha: str,
+        normalized_sha: str,
+        dhash: int,
+        prompt: str,
+        compute: Callable[[], Awaitable[str]],
+    ) -> str:
+        key = self._key(normalized_sha, prompt)
+        raw_key = self._key(raw_sha, prompt)
+
+        result = await self._result(key)
+        if result is not None:
+            record_cache("vision", "hit_exact")
+            await self._remember_raw(raw_key, key)
+            return result
+
+        if key in self._inflight:
+            record_cache("vision", "coalesced")
+            return await asyncio.shield(self._inflight[key])
+
+        record_cache("vision", "miss_near_duplicate" if self._has_near_duplicate(dhash, key.split(":")[1]) else "miss")
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # nobody may be waiting; don't let asyncio warn about an unretrieved exception
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            self.hashes.set(key, dhash)
+            await self._set("result:" + key, result)
+            await self._remember_raw(raw_key, key)
+            return result
+        finally:
+            del self._inflight[key]
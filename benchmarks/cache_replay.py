@@ -0,0 +1,70 @@
+"""
+Replays a query log through the specialist ResponseCache and reports hit rates
+per tier and the backend time saved, using fake embeddings and a fixed fake
+backend latency.
+
+    python benchmarks/cache_replay.py --log benchmarks/query_log.txt --threshold 0.9
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import fakes
+from metrics import metrics
+from response_cache import ResponseCache
+
+LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_log.txt")
+
+
+async def replay(queries: list[str], cache: ResponseCache, latency: float) -> list[float]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        lookup = await cache.lookup(query, model="fake-medgemma", options={"temperature": 0.7})
+        if not lookup.hit:
+            await asyncio.sleep(latency)
+            await cache.store(lookup, "answer to " + query)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", default=LOG_PATH)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per fake backend call")
+    parser.add_argument("--threshold", type=float, default=0.95, help="semantic tier threshold, 0 disables it")
+    parser.add_argument("--max-entries", type=int, default=1000)
+    parser.add_argument("--ttl", type=float, default=3600)
+    args = parser.parse_args()
+
+    with open(args.log, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    embeddings = fakes.FakeEmbeddings()
+    cache = ResponseCache(
+        "replay",
+        embed=embeddings.aembed_query if args.threshold else None,
+        max_entries=args.max_entries,
+        ttl_seconds=args.ttl,
+        similarity_threshold=args.threshold or None,
+    )
+    latencies = asyncio.run(replay(queries, cache, args.latency))
+
+    counters = metrics.snapshot()["counters"]
+    exact = counters.get('cache_requests{cache="replay",result="hit_exact"}', 0)
+    semantic = counters.get('cache_requests{cache="replay",result="hit_semantic"}', 0)
+    misses = counters.get('cache_requests{cache="replay",result="miss"}', 0)
+
+    print(f"queries          {len(queries)}")
+    print(f"exact hits       {exact:.0f}")
+    print(f"semantic hits    {semantic:.0f}")
+    print(f"misses           {misses:.0f}")
+    print(f"hit rate         {(exact + semantic) / len(queries):.0%}")
+    print(f"p50 latency      {statistics.median(latencies) * 1000:.2f} ms")
+    print(f"total time       {sum(latencies):.2f} s (uncached {len(queries) * args.latency:.2f} s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Deterministic local stand-ins for the model backends, so the FastAPI app can be
+driven without OpenAI, Ollama or Twilio access.
+
+Latencies are either a constant number of seconds or a seeded Latency
+distribution, so percentiles show a realistic tail and repeat run to run.
+
+blocking=True makes every fake sleep with time.sleep() inside the event loop,
+which reproduces the old synchronous request path for before/after runs.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import config
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+def route_for(message: str) -> list[str]:
+    text = message.lower()
+    tools = []
+    if any(word in text for word in ("kill myself", "suicide", "hurt myself")):
+        tools.append("emergency")
+    if any(word in text for word in ("pain", "fever", "cough", "rash", "headache")):
+        tools.append("health_specialist")
+    if "therapist" in text:
+        tools.append("find_therapist")
+    return tools or ["mental_specialist"]
+
+
+class Latency:
+    """
+    Lognormal call latency with the given median; sigma=0 is a constant.
+    Seeded, so the same run draws the same delays.
+    """
+
+    def __init__(self, median: float, sigma: float = 0.0, seed: int = 0):
+        self.median = median
+        self.sigma = sigma
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.sigma <= 0 or self.median <= 0:
+            return self.median
+        return self._random.lognormvariate(math.log(self.median), self.sigma)
+
+    def __repr__(self):
+        return f"Latency(median={self.median:g}, sigma={self.sigma:g})"
+
+
+def _seconds(latency) -> float:
+    return latency.sample() if isinstance(latency, Latency) else latency
+
+
+async def _sleep(latency, blocking: bool):
+    if blocking:
+        time.sleep(_seconds(latency))
+    else:
+        await asyncio.sleep(_seconds(latency))
+
+
+def _count_tokens(text: str) -> int:
+    # same rough 4-characters-per-token estimate the session memory uses
+    return len(text) // 4 + 1
+
+
+class FakeChatModel(BaseChatModel):
+    latency: Any = 0.5
+    blocking: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _reply(self, messages) -> str:
+        prompt = messages[-1].content
+        if "triage assistant" in prompt and "\nMessages:\n" in prompt:
+            numbered = prompt.rsplit("\nMessages:\n", 1)[-1].splitlines()
+            return json.dumps([route_for(json.loads(line.split(". ", 1)[1])) for line in numbered])
+        if "triage assistant" in prompt:
+            return json.dumps(route_for(prompt.rsplit("Message:", 1)[-1]))
+        return "I hear you, and here is a clear and friendly answer that brings everything together."
+
+    def _result(self, messages) -> ChatResult:
+        reply = self._reply(messages)
+        tokens_in = sum(_count_tokens(m.content) for m in messages)
+        usage = {"input_tokens": tokens_in, "output_tokens": _count_tokens(reply), "total_tokens": tokens_in + _count_tokens(reply)}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply, usage_metadata=usage))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(_seconds(self.latency))
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await _sleep(self.latency, self.blocking)
+        return self._result(messages)
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words vectors: deterministic, and texts that share words end
+    up close together, which is enough to exercise similarity lookups.
+    """
+
+    def __init__(self, size: int = 256, latency=0.0):
+        self.size = size
+        self.latency = latency
+
+    def _vector(self, text: str) -> list[float]:
+        vec = [0.0] * self.size
+        for word in re.findall(r"[a-z']+", text.lower()):
+            vec[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.size] += 1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(_seconds(self.latency))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        time.sleep(_seconds(self.latency))
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        await asyncio.sleep(_seconds(self.latency))
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        await asyncio.sleep(_seconds(self.latency))
+        return self._vector(text)
+
+
+class FakeOllamaClient:
+    def __init__(self, latency=0.5, blocking: bool = False):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def chat(self, model, messages, **kwargs):
+        await _sleep(self.latency, self.blocking)
+        reply = "It sounds like a lot to carry. What has been on your mind the most?"
+        return {
+            "message": {"content": reply},
+            "prompt_eval_count": sum(_count_tokens(m["content"]) for m in messages),
+            "eval_count": _count_tokens(reply),
+        }
+
+    async def generate(self, model, prompt, **kwargs):
+        return {"response": ""}
+
+
+class FakeQAChain:
+    def __init__(self, latency=0.5, blocking: bool = False):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def ainvoke(self, inputs):
+        await _sleep(self.latency, self.blocking)
+        return {"result": "The encyclopedia lists rest, fluids and seeing a doctor if it persists."}
+
+
+class FakeVisionClient:
+    def __init__(self, latency=0.5, blocking: bool = False):
+        self.latency = latency
+        self.blocking = blocking
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **kwargs):
+        await _sleep(self.latency, self.blocking)
+        message = SimpleNamespace(content="The image shows a small, evenly coloured area of skin.")
+        usage = SimpleNamespace(prompt_tokens=800, completion_tokens=_count_tokens(message.content))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class FakeTwilioClient:
+    """
+    Stands in for twilio.rest.Client. calls.create blocks like the real SDK
+    and records each call instead of dialing anyone.
+    """
+
+    def __init__(self, latency=0.3):
+        self.latency = latency
+        self.created = []
+        self.calls = SimpleNamespace(create=self._create)
+
+    def _create(self, **kwargs):
+        time.sleep(_seconds(self.latency))
+        self.created.append(kwargs)
+        return SimpleNamespace(sid=f"CA{len(self.created):032d}")
+
+
+TOPICS = [
+    "headache", "fever", "cough", "asthma", "migraine", "diabetes", "arthritis", "anemia",
+    "reflux", "eczema", "insomnia", "anxiety", "depression", "sprain", "infection", "hypertension",
+]
+WORDS = [
+    "symptoms", "treatment", "causes", "diagnosis", "rest", "fluids", "doctor", "medication",
+    "diet", "exercise", "chronic", "acute", "children", "adults", "risk", "prevention",
+]
+
+
+def fake_corpus(size: int = 2000, seed: int = 0) -> list[str]:
+    """
+    Encyclopedia-like chunks (~80 words each) for a real FAISS index over
+    FakeEmbeddings.
+    """
+    rng = random.Random(seed)
+    chunks = []
+    for i in range(size):
+        topic = TOPICS[i % len(TOPICS)]
+        words = [rng.choice(WORDS) for _ in range(70)] + [topic] * 10
+        rng.shuffle(words)
+        chunks.append(" ".join(words))
+    return chunks
+
+
+def install(latency=0.5, blocking: bool = False, latencies: dict = None, retrieval: str = "stub", state_backend: str = "memory"):
+    """
+    Swaps the live backends for fakes and returns the FastAPI app.
+
+    latencies overrides `latency` per backend: "openai" (chat models),
+    "embeddings", "rag" (stubbed RetrievalQA), "ollama", "vision", "twilio".
+    retrieval="faiss" runs the real RetrievalQA chain over an in-memory FAISS
+    index of fake_corpus(), fused with its BM25 index, instead of the stubbed chain.
+    state_backend="redis" puts the shared state (see shared_state.py) in an
+    in-process fakeredis server instead of process memory.
+    """
+    import ai_agent
+    import tools
+    import main
+    from escalation import TwilioTransport
+    from langchain_community.vectorstores import FAISS
+
+    latencies = latencies or {}
+    pick = lambda backend: latencies.get(backend, latency)
+
+    chat_model = FakeChatModel(latency=pick("openai"), blocking=blocking)
+    embeddings = FakeEmbeddings(latency=pick("embeddings"))
+    twilio = FakeTwilioClient(pick("twilio"))
+
+    ai_agent.llm = chat_model
+    ai_agent.vision_client = FakeVisionClient(pick("vision"), blocking)
+    tools.emergency_dispatcher.transport = TwilioTransport("AC-fake", "fake", "+15550000000", "+15551111111", client=twilio)
+    tools.llm_model = chat_model
+    tools.embedding_model = embeddings
+    if tools.response_cache is not None and tools.response_cache.embed is not None:
+        tools.response_cache.embed = embeddings.aembed_query
+    tools.ollama_pool.client = FakeOllamaClient(pick("ollama"), blocking)
+    if retrieval == "faiss":
+        from retrieval import BM25Index
+        corpus = fake_corpus()
+        tools._vectorstore = FAISS.from_texts(corpus, FakeEmbeddings())
+        tools._vectorstore.embedding_function = embeddings
+        tools._bm25 = BM25Index.build(corpus) if config.RETRIEVER_HYBRID else None
+        tools._qa_chain = tools._make_qa_chain(tools._vectorstore, tools._bm25)
+    else:
+        tools._vectorstore = SimpleNamespace(index=SimpleNamespace(ntotal=0))
+        tools._bm25 = None
+        tools._qa_chain = FakeQAChain(pick("rag"), blocking)
+    if state_backend == "redis":
+        import fakeredis
+        import shared_state
+        # the stores were built at import time, so swap them for Redis ones on the stand-in
+        shared_state._redis_clients[config.REDIS_URL] = fakeredis.FakeAsyncRedis()
+        if tools.response_cache is not None:
+            tools.response_cache.answers = shared_state.RedisStore("responses", config.RESPONSE_CACHE_TTL_SECONDS)
+        tools.emergency_dispatcher.store = shared_state.RedisStore("escalations", config.ESCALATION_DEDUP_SECONDS)
+        main.vision_cache.store = shared_state.RedisStore("vision", config.VISION_CACHE_TTL_SECONDS)
+        main.rate_limit_counters = shared_state.RedisStore("rate_limit", config.RATE_LIMIT_WINDOW_SECONDS)
+    main.client = FakeVisionClient(pick("vision"), blocking)
+    main.app.state.fakes = SimpleNamespace(chat_model=chat_model, embeddings=embeddings, twilio=twilio)
+    return main.app
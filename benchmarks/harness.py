@@ -0,0 +1,286 @@
+"""
+Offline benchmark of the FastAPI app: a seeded mix of /ask and
+/upload-image-openai requests against the fakes in fakes.py, with per-backend
+latency distributions. Reports p50/p95/p99 latency, throughput and peak RSS,
+and writes everything to JSON so two runs can be compared.
+
+    python benchmarks/harness.py --requests 200 --concurrency 20 --out before.json
+    python benchmarks/harness.py --requests 200 --concurrency 20 --out after.json
+    python benchmarks/harness.py --compare before.json after.json
+
+--scale shrinks every latency (e.g. 0.05 for a quick smoke run);
+--retrieval faiss runs the real RetrievalQA chain over an in-memory index;
+--shared-state redis keeps the caches and counters in fakeredis (in the dev
+dependency group: uv sync --group dev) to measure the Redis code path
+without a server.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+import fakes
+from image_encode import synthetic_upload
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+EVAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_eval.jsonl")
+
+# (median seconds, lognormal sigma) per backend. These are assumptions for a
+# hosted GPT-4 / GPT-4o and a local 4B MedGemma, not measurements; edit them
+# to match what production sees.
+PROFILES = {
+    "realistic": {
+        "openai": (0.9, 0.4),
+        "embeddings": (0.08, 0.3),
+        "rag": (1.8, 0.4),
+        "ollama": (2.5, 0.5),
+        "vision": (3.0, 0.4),
+        "twilio": (0.4, 0.3),
+    },
+    "constant": {
+        "openai": (0.5, 0.0),
+        "embeddings": (0.05, 0.0),
+        "rag": (0.5, 0.0),
+        "ollama": (0.5, 0.0),
+        "vision": (0.5, 0.0),
+        "twilio": (0.3, 0.0),
+    },
+}
+
+IMAGE_SIZES = [((640, 480), "RGB"), ((1920, 1080), "RGB"), ((4032, 3024), "RGB"), ((3000, 3000), "L")]
+
+
+def load_messages(path: str = EVAL_PATH) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["message"] for line in f if line.strip()]
+
+
+def make_images(count: int, seed: int) -> list[bytes]:
+    images = []
+    for i in range(count):
+        size, mode = IMAGE_SIZES[i % len(IMAGE_SIZES)]
+        random.seed(seed + i)  # effect_noise is not seedable on its own
+        images.append(synthetic_upload(size, mode))
+    return images
+
+
+def workload(requests: int, upload_share: float, messages: list[str], images: list[bytes], seed: int) -> list[tuple]:
+    """
+    The request sequence, fixed by the seed: ("ask", message) or ("upload", image bytes).
+    Images repeat, as re-uploads of the same photo do.
+    """
+    rng = random.Random(seed)
+    plan = []
+    for _ in range(requests):
+        if images and rng.random() < upload_share:
+            plan.append(("upload", rng.choice(images)))
+        else:
+            plan.append(("ask", rng.choice(messages)))
+    return plan
+
+
+async def send(client: httpx.AsyncClient, kind: str, payload) -> bool:
+    if kind == "ask":
+        response = await client.post("/ask", json={"message": payload})
+        return response.status_code == 200 and "response" in response.json()
+    response = await client.post("/upload-image-openai", files={"file": ("upload.jpg", payload, "image/jpeg")})
+    return response.status_code == 200 and "diagnosis" in response.json()
+
+
+async def drive(app, plan: list[tuple], concurrency: int, warmup: list[tuple]) -> tuple[list[tuple], float]:
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    # ASGITransport does not run the lifespan, so start it by hand
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for kind, payload in warmup:
+                await send(client, kind, payload)
+
+            queue = iter(plan)
+
+            async def worker():
+                for kind, payload in queue:
+                    start = time.perf_counter()
+                    try:
+                        ok = await send(client, kind, payload)
+                    except Exception:
+                        ok = False
+                    results.append((kind, time.perf_counter() - start, ok))
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+    return results, elapsed
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(results: list[tuple], elapsed: float) -> dict:
+    latencies = sorted(seconds for _, seconds, _ in results)
+    return {
+        "requests": len(results),
+        "errors": sum(1 for _, _, ok in results if not ok),
+        "throughput_rps": round(len(results) / elapsed, 3) if elapsed else 0.0,
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        "p50_ms": round(1000 * percentile(latencies, 50), 2),
+        "p95_ms": round(1000 * percentile(latencies, 95), 2),
+        "p99_ms": round(1000 * percentile(latencies, 99), 2),
+        "max_ms": round(1000 * latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def server_timings() -> dict:
+    from metrics import metrics
+    timers = metrics.snapshot()["timers"]
+    return {
+        name: stats["avg_seconds"] for name, stats in sorted(timers.items())
+        if name.startswith(("graph_node_seconds", "external_call_seconds", "ollama_queue_wait_seconds"))
+    }
+
+
+def run(args) -> dict:
+    profile = {
+        backend: fakes.Latency(median * args.scale, sigma, seed=args.seed + i)
+        for i, (backend, (median, sigma)) in enumerate(PROFILES[args.profile].items())
+    }
+    app = fakes.install(latencies=profile, retrieval=args.retrieval, state_backend=args.shared_state)
+
+    messages = load_messages()
+    images = make_images(args.images, args.seed) if args.upload_share > 0 else []
+    plan = workload(args.requests, args.upload_share, messages, images, args.seed)
+    warmup = workload(args.warmup, args.upload_share, messages, images, args.seed + 1)
+
+    results, elapsed = asyncio.run(drive(app, plan, args.concurrency, warmup))
+
+    summary = {"overall": summarize(results, elapsed)}
+    for kind in ("ask", "upload"):
+        subset = [r for r in results if r[0] == kind]
+        if subset:
+            summary[kind] = summarize(subset, elapsed)
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+            "latencies": {backend: repr(latency) for backend, latency in profile.items()},
+        },
+        "summary": summary,
+        "elapsed_seconds": round(elapsed, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "emergency_calls": len(app.state.fakes.twilio.created),
+        "server_avg_seconds": server_timings(),
+    }
+
+
+def print_summary(report: dict):
+    print(f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, stats in report["summary"].items():
+        print(
+            f"{kind:<10}{stats['requests']:>10}{stats['errors']:>8}{stats['throughput_rps']:>10.2f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}"
+        )
+    print(f"peak RSS   {report['peak_rss_mb']} MB")
+
+
+# (metric, higher is better)
+COMPARED = [("throughput_rps", True), ("p50_ms", False), ("p95_ms", False), ("p99_ms", False)]
+
+
+def compare(base_path: str, new_path: str, tolerance: float) -> int:
+    """
+    Prints base vs new per endpoint and returns 1 if any metric got worse by
+    more than `tolerance` (a fraction), else 0.
+    """
+    with open(base_path, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+
+    rows = []
+    for kind in base["summary"]:
+        if kind not in new["summary"]:
+            continue
+        for metric, higher_is_better in COMPARED:
+            rows.append((f"{kind}.{metric}", base["summary"][kind][metric], new["summary"][kind][metric], higher_is_better))
+    if base.get("peak_rss_mb") and new.get("peak_rss_mb"):
+        rows.append(("peak_rss_mb", base["peak_rss_mb"], new["peak_rss_mb"], False))
+
+    regressions = 0
+    print(f"{'metric':<26}{'base':>12}{'new':>12}{'change':>10}")
+    for name, old, value, higher_is_better in rows:
+        change = (value - old) / old if old else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"{name:<26}{old:>12.2f}{value:>12.2f}{change:>+10.1%}{flag}")
+    return 1 if regressions else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline /ask + /upload-image-openai benchmark.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    parser.add_argument("--upload-share", type=float, default=0.2, help="fraction of requests that upload an image")
+    parser.add_argument("--images", type=int, default=8, help="distinct images to draw uploads from")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="realistic")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies every backend latency")
+    parser.add_argument("--retrieval", choices=["stub", "faiss"], default="stub")
+    parser.add_argument("--shared-state", choices=["memory", "redis"], default="memory")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two reports instead of running")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression for --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.tolerance))
+
+    report = run(args)
+    print_summary(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
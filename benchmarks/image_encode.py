@@ -0,0 +1,75 @@
+"""
+Bytes sent and encode time per image size class for the /upload-image-openai
+payload: the old full-size PNG re-encode versus imaging.prepare_image.
+
+    python benchmarks/image_encode.py --repeat 5
+"""
+import argparse
+import base64
+import os
+import statistics
+import sys
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from imaging import prepare_image
+
+SIZE_CLASSES = {
+    "small 640x480": ((640, 480), "RGB"),
+    "hd 1920x1080": ((1920, 1080), "RGB"),
+    "phone 4032x3024": ((4032, 3024), "RGB"),
+    "x-ray 3000x3000": ((3000, 3000), "L"),
+}
+
+
+def synthetic_upload(size, mode) -> bytes:
+    # noise plus shapes, blurred: compresses roughly like a photo rather than a flat test card
+    image = Image.effect_noise(size, 40).convert(mode)
+    draw = ImageDraw.Draw(image)
+    for i in range(0, min(size) // 2, max(1, min(size) // 24)):
+        draw.ellipse([i, i, size[0] - i, size[1] - i], outline=128 + i % 100, width=8)
+    image = image.filter(ImageFilter.GaussianBlur(2))
+    buffer = BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def old_pipeline(contents: bytes) -> str:
+    image = Image.open(BytesIO(contents)).convert("RGB")
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def timed(fn, contents: bytes, repeat: int):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(contents)
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'size class':<18}{'upload KB':>11}{'old KB':>10}{'old ms':>9}{'new KB':>10}{'new ms':>9}")
+    for name, (size, mode) in SIZE_CLASSES.items():
+        contents = synthetic_upload(size, mode)
+        old, old_time = timed(old_pipeline, contents, args.repeat)
+        new, new_time = timed(prepare_image, contents, args.repeat)
+        print(
+            f"{name:<18}{len(contents) / 1024:>11.0f}"
+            f"{len(old) / 1024:>10.0f}{old_time * 1000:>9.1f}"
+            f"{len(new.base64) / 1024:>10.0f}{new_time * 1000:>9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Concurrent /ask throughput with stubbed model backends.
+
+Runs the same workload twice: once with fakes that block the event loop (how
+the synchronous graph.invoke path behaved) and once with non-blocking fakes
+(the ainvoke path).
+
+    python benchmarks/load_test.py --requests 40 --concurrency 20 --latency 0.2
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+import fakes
+
+MESSAGES = [
+    "I feel anxious before exams",
+    "I have had a headache and fever since yesterday",
+    "Can you find a therapist near me?",
+    "I can't sleep and I keep overthinking",
+]
+
+
+async def run(app, requests: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(i: int):
+            async with semaphore:
+                response = await client.post("/ask", json={"message": MESSAGES[i % len(MESSAGES)]})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake backend call")
+    args = parser.parse_args()
+
+    print(f"{'mode':<10}{'elapsed (s)':>14}{'req/s':>10}")
+    for mode, blocking in (("blocking", True), ("async", False)):
+        app = fakes.install(latency=args.latency, blocking=blocking)
+        elapsed = asyncio.run(run(app, args.requests, args.concurrency))
+        print(f"{mode:<10}{elapsed:>14.2f}{args.requests / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Recall / latency / memory of each FAISS index type in retrieval.py, measured
+against exact (flat) search: recall@k, single-query p50/p95 latency, batched
+throughput, index size and build time, with efSearch (HNSW) and nprobe (IVF-PQ)
+swept.
+
+    python benchmarks/retrieval_benchmark.py                          # synthetic clustered vectors
+    python benchmarks/retrieval_benchmark.py --index data/faiss_index_openai
+
+With --index the corpus is the vectors of a built index and the queries are
+corpus vectors with noise added; otherwise both come from one seeded mixture
+of low-rank topics, unit-normalized like OpenAI embeddings. PQ recall depends
+heavily on the data, so check the real index before switching to ivfpq.
+
+--hybrid compares vector, BM25 and fused (RRF) retrieval instead: hit@k on
+known-item queries (a chunk's rarest term plus a few of its other words, the
+way users type drug names and conditions), per-query latency, and the BM25
+index's build time, size and load time.
+
+    python benchmarks/retrieval_benchmark.py --hybrid                 # synthetic text, hashed embeddings
+    python benchmarks/retrieval_benchmark.py --hybrid --index data/faiss_index_openai
+
+The synthetic run embeds with the hashed bag-of-words stand-in from fakes.py,
+which says nothing about how OpenAI embeddings handle rare terms; with --index
+the queries are embedded with the app's embedding model (needs the API key).
+"""
+import argparse
+import json
+import os
+import pickle
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from retrieval import INDEX_TYPES, BM25Index, fuse_documents, make_search_index, set_search_params, tokenize
+
+SWEEPS = {"hnsw": ("efSearch", [16, 64, 256]), "ivfpq": ("nprobe", [4, 16, 64])}
+
+
+def normalized(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic(chunks: int, queries: int, dim: int, clusters: int, seed: int, rank: int = 32) -> tuple:
+    """
+    Each topic is a center plus a random rank-`rank` subspace: text embeddings
+    have a low intrinsic dimension, and isotropic noise would make every
+    neighbor in a topic almost equally far away.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    bases = rng.standard_normal((clusters, rank, dim), dtype=np.float32) / np.sqrt(rank)
+
+    def draw(n):
+        topics = rng.integers(clusters, size=n)
+        x = centers[topics] + 0.05 * rng.standard_normal((n, dim), dtype=np.float32)
+        for topic in range(clusters):
+            rows = np.flatnonzero(topics == topic)
+            x[rows] += 0.8 * rng.standard_normal((len(rows), rank), dtype=np.float32) @ bases[topic]
+        return normalized(x)
+
+    return draw(chunks), draw(queries)
+
+
+def from_index(path: str, queries: int, seed: int) -> tuple:
+    flat = faiss.read_index(os.path.join(path, "index.faiss"))
+    corpus = flat.reconstruct_n(0, flat.ntotal)
+    rng = np.random.default_rng(seed)
+    picked = corpus[rng.choice(len(corpus), queries, replace=False)]
+    noise = rng.standard_normal(picked.shape, dtype=np.float32) * np.linalg.norm(picked, axis=1, keepdims=True) / np.sqrt(picked.shape[1])
+    return corpus, (picked + 0.5 * noise).astype(np.float32)
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    batch_seconds = time.perf_counter() - start
+
+    recall = statistics.mean(len(set(row) & set(expected)) / k for row, expected in zip(found.tolist(), truth.tolist()))
+    latencies.sort()
+    return {
+        f"recall@{k}": round(recall, 4),
+        "p50_ms": round(1000 * latencies[len(latencies) // 2], 3),
+        "p95_ms": round(1000 * latencies[int(len(latencies) * 0.95) - 1], 3),
+        "batch_qps": round(len(queries) / batch_seconds, 1),
+    }
+
+
+# ----------------------------------------------
+# Vector vs BM25 vs hybrid
+# ----------------------------------------------
+SYLLABLES = ["zor", "va", "ti", "nib", "cal", "mex", "lo", "pra", "dex", "sul", "fa", "mi", "ron", "quel", "tra", "zil"]
+SUFFIXES = ["mab", "pril", "statin", "olol", "itis", "emia", "oma", "azole", "cillin", "sartan"]
+
+
+def synthetic_texts(chunks: int, seed: int) -> list[str]:
+    """
+    Encyclopedia-like chunks over the fakes' topics and words, each mentioning
+    one or two made-up drug or condition names, some of them shared.
+    """
+    import fakes
+
+    rng = np.random.default_rng(seed)
+    names = sorted({
+        "".join(rng.choice(SYLLABLES, size=rng.integers(2, 4))) + rng.choice(SUFFIXES)
+        for _ in range(chunks)
+    })
+    texts = []
+    for i in range(chunks):
+        words = list(rng.choice(fakes.WORDS, size=70)) + [fakes.TOPICS[i % len(fakes.TOPICS)]] * 8
+        # Zipf-ish: a few names come up in many chunks, most in one or two
+        words += [names[min(int(rng.zipf(1.3)) - 1 + int(rng.integers(len(names))) // 8, len(names) - 1)]
+                  for _ in range(rng.integers(1, 3))]
+        rng.shuffle(words)
+        texts.append(" ".join(words))
+    return texts
+
+
+def known_item_queries(texts: list[str], bm25: BM25Index, count: int, seed: int) -> list[tuple[str, int]]:
+    """
+    (query, position of the chunk it was drawn from): the chunk's rarest term
+    plus three of its other words.
+    """
+    rng = np.random.default_rng(seed)
+    document_frequency = {term: int(bm25.offsets[i + 1] - bm25.offsets[i]) for i, term in enumerate(bm25.terms.tolist())}
+    queries = []
+    for position in rng.choice(len(texts), min(count, len(texts)), replace=False):
+        tokens = tokenize(texts[position])
+        if len(tokens) < 4:
+            continue
+        rare = min(tokens, key=lambda t: document_frequency.get(t.encode(), len(texts)))
+        others = [t for t in tokens if t != rare]
+        words = [rare] + list(rng.choice(others, size=min(3, len(others)), replace=False))
+        rng.shuffle(words)
+        queries.append((" ".join(words), int(position)))
+    return queries
+
+
+def load_texts(path: str) -> tuple:
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    flat = faiss.read_index(os.path.join(path, "index.faiss"))
+    texts = [docstore.search(index_to_docstore_id[i]).page_content for i in range(flat.ntotal)]
+    return texts, flat
+
+
+def hybrid_benchmark(args) -> dict:
+    import fakes  # also points config at a fake API key when none is set
+    from langchain_core.documents import Document
+
+    if args.index:
+        from tools import get_embedding_model
+        texts, flat = load_texts(args.index)
+        embeddings = get_embedding_model()
+    else:
+        texts = synthetic_texts(args.chunks, args.seed)
+        embeddings = fakes.FakeEmbeddings()
+        flat = faiss.IndexFlatL2(embeddings.size)
+        flat.add(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+
+    start = time.perf_counter()
+    bm25 = BM25Index.build(texts)
+    build_seconds = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        bm25.save(os.path.join(tmp, "bm25"))
+        size_mb = sum(os.path.getsize(os.path.join(tmp, "bm25", name)) for name in os.listdir(os.path.join(tmp, "bm25"))) / 2**20
+        start = time.perf_counter()
+        bm25 = BM25Index.load(os.path.join(tmp, "bm25"))
+        load_ms = 1000 * (time.perf_counter() - start)
+
+        queries = known_item_queries(texts, bm25, args.queries, args.seed)
+        vectors = np.asarray(embeddings.embed_documents([q for q, _ in queries]), dtype=np.float32)
+        # just enough of a vectorstore for fuse_documents; ids are positions
+        ids = {i: str(i) for i in range(len(texts))}
+        store = SimpleNamespace(index_to_docstore_id=ids, docstore=SimpleNamespace(search=lambda i: Document(id=i, page_content="")))
+
+        def dense(vector, k):
+            return [int(i) for i in flat.search(vector[None, :], k)[1][0] if i != -1]
+
+        def hybrid(query, vector, k):
+            fused = fuse_documents(store, [Document(id=ids[i], page_content="") for i in dense(vector, args.fetch_k)],
+                                   bm25.search(query, args.fetch_k), k)
+            return [int(doc.id) for doc in fused]
+
+        methods = {
+            "vector": lambda query, vector: dense(vector, args.k),
+            "bm25": lambda query, vector: bm25.search(query, args.k),
+            "hybrid": lambda query, vector: hybrid(query, vector, args.k),
+        }
+        rows = []
+        for name, search in methods.items():
+            hits, latencies = 0, []
+            for (query, target), vector in zip(queries, vectors):
+                start = time.perf_counter()
+                found = search(query, vector)
+                latencies.append(time.perf_counter() - start)
+                # identical chunks are equally right
+                hits += any(texts[i] == texts[target] for i in found)
+            latencies.sort()
+            rows.append({
+                "method": name,
+                f"hit@{args.k}": round(hits / len(queries), 4),
+                "p50_ms": round(1000 * latencies[len(latencies) // 2], 3),
+                "p95_ms": round(1000 * latencies[int(len(latencies) * 0.95) - 1], 3),
+            })
+
+    hit = f"hit@{args.k}"
+    print(f"{len(texts)} chunks, {len(queries)} known-item queries, k={args.k}, fetch_k={args.fetch_k}")
+    print(f"BM25 index: built in {build_seconds:.2f}s, {size_mb:.1f} MB on disk, loaded (mmap) in {load_ms:.2f} ms")
+    print(f"{'method':<10}{hit:>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for row in rows:
+        print(f"{row['method']:<10}{row[hit]:>10.3f}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}")
+    return {
+        "chunks": len(texts),
+        "queries": len(queries),
+        "bm25": {"build_seconds": round(build_seconds, 3), "size_mb": round(size_mb, 2), "load_ms": round(load_ms, 3)},
+        "results": rows,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency/memory of the FAISS index types.")
+    parser.add_argument("--index", help="use the vectors of this built index instead of synthetic ones")
+    parser.add_argument("--chunks", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=1536, help="synthetic vector size")
+    parser.add_argument("--clusters", type=int, default=200, help="synthetic topics")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nlist", type=int, help="IVF lists (default ~4*sqrt(n))")
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--threads", type=int, help="FAISS OpenMP threads")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--hybrid", action="store_true", help="compare vector, BM25 and fused retrieval instead")
+    parser.add_argument("--fetch-k", type=int, default=20, help="candidates per side for --hybrid fusion")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    if args.threads:
+        faiss.omp_set_num_threads(args.threads)
+    if args.hybrid:
+        report = hybrid_benchmark(args)
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({"args": vars(args), **report}, f, indent=2)
+        return
+    if args.index:
+        corpus, queries = from_index(args.index, args.queries, args.seed)
+    else:
+        corpus, queries = synthetic(args.chunks, args.queries, args.dim, args.clusters, args.seed)
+
+    flat = faiss.IndexFlatL2(corpus.shape[1])
+    flat.add(corpus)
+    _, truth = flat.search(queries, args.k)
+
+    rows = []
+    for index_type in args.types:
+        start = time.perf_counter()
+        try:
+            index = make_search_index(flat, index_type, nlist=args.nlist)
+        except ValueError as e:
+            print(f"skipping {index_type}: {e}")
+            continue
+        build_seconds = time.perf_counter() - start
+        memory_mb = len(faiss.serialize_index(index)) / 2**20
+
+        param, values = SWEEPS.get(index_type, (None, [None]))
+        for value in values:
+            if param == "efSearch":
+                set_search_params(index, index_type, ef_search=value)
+            elif param == "nprobe":
+                set_search_params(index, index_type, nprobe=value)
+            rows.append({
+                "type": index_type,
+                "param": f"{param}={value}" if param else "",
+                "build_seconds": round(build_seconds, 2),
+                "memory_mb": round(memory_mb, 1),
+                **measure(index, queries, truth, args.k),
+            })
+
+    recall = f"recall@{args.k}"
+    print(f"{len(corpus)} vectors x {corpus.shape[1]} dims, {len(queries)} queries, k={args.k}")
+    print(f"{'type':<8}{'param':<14}{recall:>10}{'p50 ms':>10}{'p95 ms':>10}{'batch q/s':>12}{'MB':>9}{'build s':>9}")
+    for row in rows:
+        print(
+            f"{row['type']:<8}{row['param']:<14}{row[recall]:>10.3f}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}"
+            f"{row['batch_qps']:>12.1f}{row['memory_mb']:>9.1f}{row['build_seconds']:>9.2f}"
+        )
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"args": vars(args), "vectors": len(corpus), "dim": int(corpus.shape[1]), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Routing latency, LLM-call rate and accuracy on the labeled eval set
+(routing_eval.jsonl), for the local fast-path tier, the tiered router and the
+prompt-based GPT-4 router.
+
+    python benchmarks/routing_benchmark.py            # local tier only
+    python benchmarks/routing_benchmark.py --llm      # also calls GPT-4 (needs OPENAI_API_KEY in config.py)
+
+A prediction counts as correct when it picks exactly the labeled set of tools.
+"false alarms" counts messages routed to emergency that are not labeled so.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from config import LOCAL_ROUTER_MIN_CONFIDENCE
+from fast_router import local_router
+
+EVAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_eval.jsonl")
+
+
+def load_eval(path: str = EVAL_PATH) -> list[dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def report(name: str, latencies: list[float], llm_calls: int, correct: int, emergency_hits: int, false_alarms: int, total: int, emergencies: int):
+    print(
+        f"{name:<10}"
+        f"{statistics.median(latencies) * 1000:>12.3f}"
+        f"{sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:>12.3f}"
+        f"{llm_calls / total:>12.0%}"
+        f"{correct / total:>12.0%}"
+        f"{(emergency_hits / emergencies if emergencies else 1.0):>14.0%}"
+        f"{false_alarms:>14}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm", action="store_true", help="also run the GPT-4 prompt router")
+    parser.add_argument("--threshold", type=float, default=LOCAL_ROUTER_MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    rows = load_eval()
+    emergencies = sum("emergency" in row["labels"] for row in rows)
+
+    local = []
+    for row in rows:
+        start = time.perf_counter()
+        tools, confidence = local_router.route(row["message"])
+        local.append((tools, confidence, time.perf_counter() - start))
+
+    llm = None
+    if args.llm:
+        from ai_agent import llm_route
+        llm = []
+        for row in rows:
+            start = time.perf_counter()
+            tools = await llm_route(row["message"])
+            llm.append((tools or ["mental_specialist"], time.perf_counter() - start))
+
+    fast = [(tools, elapsed) for (tools, confidence, elapsed) in local if confidence >= args.threshold]
+    fast_rows = [row for row, (_, confidence, _) in zip(rows, local) if confidence >= args.threshold]
+    print(f"local tier answers {len(fast)}/{len(rows)} messages on its own "
+          f"({sum(set(t) == set(r['labels']) for (t, _), r in zip(fast, fast_rows))} correct)\n")
+    print(f"{'router':<10}{'p50 (ms)':>12}{'p95 (ms)':>12}{'LLM calls':>12}{'accuracy':>12}{'emerg. recall':>14}{'false alarms':>14}")
+
+    def score(predictions):
+        correct = sum(set(p) == set(row["labels"]) for p, row in zip(predictions, rows))
+        emergency_hits = sum("emergency" in p for p, row in zip(predictions, rows) if "emergency" in row["labels"])
+        # each one is a phone call to the emergency contact that should not have happened
+        false_alarms = sum("emergency" in p for p, row in zip(predictions, rows) if "emergency" not in row["labels"])
+        return correct, emergency_hits, false_alarms
+
+    predictions = [tools for tools, _, _ in local]
+    report("local", [e for _, _, e in local], 0, *score(predictions), len(rows), emergencies)
+
+    if llm is not None:
+        predictions = [tools for tools, _ in llm]
+        report("llm", [e for _, e in llm], len(rows), *score(predictions), len(rows), emergencies)
+
+        tiered, latencies, calls = [], [], 0
+        for (tools, confidence, local_elapsed), (llm_tools, llm_elapsed) in zip(local, llm):
+            if confidence >= args.threshold:
+                tiered.append(tools)
+                latencies.append(local_elapsed)
+            else:
+                tiered.append(llm_tools)
+                latencies.append(local_elapsed + llm_elapsed)
+                calls += 1
+        report("tiered", latencies, calls, *score(tiered), len(rows), emergencies)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
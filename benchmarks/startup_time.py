@@ -0,0 +1,174 @@
+"""
+Cold-start report for the backend: how long `import main` takes in a fresh
+interpreter, and how long a real uvicorn worker takes to answer /healthz
+(live) and /readyz (ready), with the warm-up phase breakdown.
+
+The worker runs the real app with real client objects, but against a
+throwaway FAISS index of random vectors and an unreachable Ollama host, so no
+API key, PDF or GPU is needed. Ollama therefore shows up as "degraded".
+
+    python benchmarks/startup_time.py --runs 5 --chunks 20000
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+
+PRELUDE = """
+import config
+config.OPENAI_API_KEY = config.OPENAI_API_KEY or "sk-fake"
+config.INDEX_PATH = {index_path!r}
+config.EMBEDDING_CACHE_PATH = {cache_path!r}
+config.OLLAMA_HOST = "http://127.0.0.1:9"
+"""
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+SERVE_SNIPPET = """
+import uvicorn
+uvicorn.run("main:app", host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+
+def make_index(path: str, chunks: int, dim: int = 1536):
+    import numpy as np
+    import faiss
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+
+    rng = np.random.default_rng(0)
+    index = faiss.IndexFlatL2(dim)
+    index.add(rng.standard_normal((chunks, dim), dtype=np.float32))
+    ids = [str(i) for i in range(chunks)]
+    docstore = InMemoryDocstore({i: Document(page_content=f"chunk {i} " + "text " * 80) for i in ids})
+    FAISS(DeterministicFakeEmbedding(size=dim), index, docstore, dict(enumerate(ids))).save_local(path)
+
+
+def python(code: str, **kwargs):
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, **kwargs
+    )
+
+
+def import_times(prelude: str, runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        result = python(prelude + IMPORT_SNIPPET, check=True)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def slowest_imports(prelude: str, top: int = 8) -> list[tuple]:
+    """
+    (cumulative seconds, module) for main and the modules it imports directly.
+    """
+    result = python(prelude + "import main", env={**os.environ, "PYTHONPROFILEIMPORTTIME": "1"})
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = len(name) - len(name.lstrip())
+        if cumulative.strip().isdigit() and depth <= 3:
+            rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+    except OSError:
+        return None, None
+
+
+def time_to_ready(prelude: str, timeout: float = 300) -> dict:
+    port = free_port()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", prelude + SERVE_SNIPPET.format(port=port)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    live = ready = None
+    body = {}
+    try:
+        while time.perf_counter() - start < timeout:
+            if live is None and get(f"http://127.0.0.1:{port}/healthz")[0] == 200:
+                live = time.perf_counter() - start
+            if live is not None:
+                status, body = get(f"http://127.0.0.1:{port}/readyz")
+                if status == 200 or (body or {}).get("error"):
+                    ready = time.perf_counter() - start if status == 200 else None
+                    break
+            time.sleep(0.05)
+    finally:
+        process.terminate()
+        process.wait()
+    return {"live_seconds": live, "ready_seconds": ready, "readyz": body}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--chunks", type=int, default=5000, help="vectors in the throwaway index")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "index")
+        make_index(index_path, args.chunks)
+        prelude = PRELUDE.format(index_path=index_path, cache_path=os.path.join(tmp, "embeddings.sqlite"))
+
+        times = import_times(prelude, args.runs)
+        slowest = slowest_imports(prelude)
+        startups = [time_to_ready(prelude) for _ in range(args.runs)]
+
+    live = [s["live_seconds"] for s in startups if s["live_seconds"] is not None]
+    ready = [s["ready_seconds"] for s in startups if s["ready_seconds"] is not None]
+    report = {
+        "runs": args.runs,
+        "index_chunks": args.chunks,
+        "import_main_seconds": {"median": round(statistics.median(times), 3), "min": round(min(times), 3)},
+        "slowest_top_level_imports": [{"module": name, "seconds": round(s, 3)} for s, name in slowest],
+        "time_to_live_seconds": round(statistics.median(live), 3) if live else None,
+        "time_to_ready_seconds": round(statistics.median(ready), 3) if ready else None,
+        "last_readyz": startups[-1]["readyz"],
+    }
+
+    print(f"import main        median {report['import_main_seconds']['median']:.3f}s  min {report['import_main_seconds']['min']:.3f}s")
+    for row in report["slowest_top_level_imports"]:
+        print(f"  {row['module']:<28}{row['seconds']:.3f}s")
+    print(f"time to /healthz   {report['time_to_live_seconds']}s")
+    print(f"time to /readyz    {report['time_to_ready_seconds']}s")
+    print(f"warm-up phases     {json.dumps(report['last_readyz'].get('phases'))}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Memory held by N backend workers that each load the same FAISS index, with
+and without FAISS_MMAP. Every worker loads the index the way the app does
+(tools.load_vectorstore) and runs one search so all vectors are paged in;
+then the parent reads each worker's RSS and PSS (proportional set size:
+shared pages are split between the processes mapping them) from /proc.
+With mmap the vectors are page cache shared by every worker, so total PSS
+grows by about one index, not N. Linux only.
+
+    python benchmarks/worker_memory.py --workers 4 --chunks 20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from startup_time import BACKEND_DIR, PRELUDE, make_index
+
+WORKER_SNIPPET = """
+import sys
+import numpy as np
+from tools import load_vectorstore
+vectorstore = load_vectorstore(config.INDEX_PATH, mmap={mmap})
+index = vectorstore.index
+index.search(np.random.default_rng(0).standard_normal((8, index.d), dtype=np.float32), 4)
+print("ready", flush=True)
+sys.stdin.read()
+"""
+
+
+def memory_kb(pid: int) -> dict:
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup", encoding="utf-8") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                fields[name.lower()] = int(rest.split()[0])
+    return fields
+
+
+def measure(prelude: str, workers: int, mmap: bool) -> dict:
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-c", prelude + WORKER_SNIPPET.format(mmap=mmap)],
+            cwd=BACKEND_DIR, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+        )
+        for _ in range(workers)
+    ]
+    try:
+        for process in processes:
+            if process.stdout.readline().strip() != "ready":
+                raise RuntimeError("worker failed to load the index")
+        usage = [memory_kb(process.pid) for process in processes]
+    finally:
+        for process in processes:
+            process.stdin.close()
+            process.wait()
+    return {
+        "mmap": mmap,
+        "rss_mb_per_worker": round(sum(u["rss"] for u in usage) / len(usage) / 1024, 1),
+        "pss_mb_total": round(sum(u["pss"] for u in usage) / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--chunks", type=int, default=20000, help="vectors in the throwaway index")
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index_path = os.path.join(tmp, "index")
+        make_index(index_path, args.chunks)
+        index_mb = os.path.getsize(os.path.join(index_path, "index.faiss")) / 2**20
+        prelude = PRELUDE.format(index_path=index_path, cache_path=os.path.join(tmp, "embeddings.sqlite"))
+        rows = [measure(prelude, args.workers, mmap) for mmap in (False, True)]
+
+    print(f"{args.workers} workers, index.faiss {index_mb:.1f} MB")
+    print(f"{'FAISS_MMAP':<12}{'RSS/worker MB':>16}{'total PSS MB':>16}")
+    for row in rows:
+        print(f"{str(row['mmap']):<12}{row['rss_mb_per_worker']:>16.1f}{row['pss_mb_total']:>16.1f}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"workers": args.workers, "index_mb": round(index_mb, 1), "runs": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,6 @@
+import hashlib
+import json
+import uuid
 import streamlit as st
 import requests
 from PIL import Image
@@ -10,6 +13,11 @@ st.title("🧠 SafeSpace – AI Mental Health & Medical Assistant")
 # -------------------------------
 if "messages" not in st.session_state:
     st.session_state.messages = []
+if "vision_results" not in st.session_state:
+    st.session_state.vision_results = {}
+if "session_id" not in st.session_state:
+    # lets the backend remember this conversation across turns
+    st.session_state.session_id = str(uuid.uuid4())
 
 # -------------------------------
 # Display previous messages
@@ -18,6 +26,32 @@ for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.write(msg["content"])
 
+# -------------------------------
+# Streamed answer from the backend
+# -------------------------------
+def stream_answer(message, progress):
+    """
+    Reads the /ask/stream Server-Sent Events and yields the answer text as it
+    arrives, showing which specialists have finished in the meantime.
+    """
+    with requests.post("http://localhost:8000/ask/stream", json={"message": message, "session_id": st.session_state.session_id}, stream=True) as response:
+        response.raise_for_status()
+        event, streamed = None, False
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "node":
+                    progress.caption(f"✔️ {data['node'].replace('_', ' ')} done")
+                elif event == "token":
+                    streamed = True
+                    yield data["text"]
+                elif event == "done" and not streamed:
+                    yield data["response"]
+                elif event == "error":
+                    yield f"⚠️ Backend error: {data['error']}"
+
 # -------------------------------
 # Chat input for text
 # -------------------------------
@@ -28,21 +62,19 @@ if text_input:
     with st.chat_message("user"):
         st.write(text_input)
 
-    try:
-        response = requests.post("http://localhost:8000/ask", json={"message": text_input})
-        if response.status_code == 200:
-            data = response.json()
-            assistant_response = data.get("response", "⚠️ No response provided.")
-        else:
-            assistant_response = f"⚠️ Backend error: Status code {response.status_code}"
-    except requests.exceptions.JSONDecodeError:
-        assistant_response = "⚠️ Backend returned invalid JSON."
-    except Exception as e:
-        assistant_response = f"⚠️ Request failed: {e}"
-
-    st.session_state.messages.append({"role": "assistant", "content": assistant_response})
     with st.chat_message("assistant"):
-        st.write(assistant_response)
+        progress = st.empty()
+        try:
+            assistant_response = st.write_stream(stream_answer(text_input, progress))
+        except requests.exceptions.HTTPError as e:
+            assistant_response = f"⚠️ Backend error: Status code {e.response.status_code}"
+            st.write(assistant_response)
+        except Exception as e:
+            assistant_response = f"⚠️ Request failed: {e}"
+            st.write(assistant_response)
+        progress.empty()
+
+    st.session_state.messages.append({"role": "assistant", "content": assistant_response or "⚠️ No response provided."})
 
 # -------------------------------
 # Upload and process medical image
@@ -59,29 +91,39 @@ if image_file:
     except Exception as e:
         st.error(f"❌ Error displaying image: {e}")
 
-    with st.spinner("Analyzing image with GPT-4 Vision..."):
-        try:
-            image_file.seek(0)
-            file_bytes = image_file.read()
+    image_file.seek(0)
+    file_bytes = image_file.read()
+    image_hash = hashlib.sha256(file_bytes).hexdigest()
 
-            files = {
-                "file": (image_file.name, file_bytes, image_file.type)
-            }
-            response = requests.post("http://localhost:8000/upload-image-openai", files=files)
+    # Streamlit reruns this script on every interaction; only new images go to the backend
+    result = st.session_state.vision_results.get(image_hash)
+    is_new = result is None
+    if is_new:
+        with st.spinner("Analyzing image with GPT-4 Vision..."):
             try:
-                result = response.json()
-            except requests.exceptions.JSONDecodeError:
-                result = {"error": "⚠️ Backend did not return valid JSON."}
-        except Exception as e:
-            result = {"error": f"Image analysis failed: {e}"}
+                response = requests.get(f"http://localhost:8000/upload-image-openai/{image_hash}")
+                if response.status_code != 200:
+                    files = {
+                        "file": (image_file.name, file_bytes, image_file.type)
+                    }
+                    response = requests.post("http://localhost:8000/upload-image-openai", files=files)
+                try:
+                    result = response.json()
+                except requests.exceptions.JSONDecodeError:
+                    result = {"error": "⚠️ Backend did not return valid JSON."}
+            except Exception as e:
+                result = {"error": f"Image analysis failed: {e}"}
+        if "diagnosis" in result:
+            st.session_state.vision_results[image_hash] = result
 
     st.subheader("🩺 GPT-4 Vision Diagnosis")
     if "diagnosis" in result:
         st.success(result["diagnosis"])
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": "🖼️ Image Insight:\n" + result["diagnosis"]
-        })
+        if is_new:
+            st.session_state.messages.append({
+                "role": "assistant",
+                "content": "🖼️ Image Insight:\n" + result["diagnosis"]
+            })
     else:
         st.error(result.get("error", "Something went wrong."))
 
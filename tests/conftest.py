@@ -0,0 +1,6 @@
+import os
+import sys
+
+# backend/ modules import each other by bare name, and the fakes live in benchmarks/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "backend"), os.path.join(ROOT, "benchmarks")]
@@ -0,0 +1,35 @@
+import asyncio
+import json
+
+import httpx
+
+
+def test_batch_survives_a_failed_routing_prompt(monkeypatch):
+    import ai_agent
+    import fakes
+
+    app = fakes.install(latency=0.0)
+    monkeypatch.setattr(ai_agent, "BATCH_ROUTING_CHUNK", 2)
+    calls = []
+
+    async def flaky_route_batch(messages):
+        calls.append(messages)
+        if len(calls) == 1:
+            raise RuntimeError("429 Too Many Requests")
+        return [["mental_specialist"] for _ in messages]
+
+    monkeypatch.setattr(ai_agent, "llm_route_batch", flaky_route_batch)
+    messages = ["hi", "Can you help me?", "hello there", "what now?"]
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+                response = await client.post("/ask/batch", json={"messages": messages})
+        assert response.status_code == 200
+        lines = [json.loads(line) for line in response.text.splitlines()]
+        assert [line["index"] for line in lines] == list(range(len(messages)))
+        assert all("response" in line for line in lines)
+        assert len(calls) == 2
+
+    asyncio.run(run())
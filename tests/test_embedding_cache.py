@@ -0,0 +1,44 @@
+import asyncio
+import sqlite3
+
+from langchain_core.embeddings import Embeddings
+
+from embedding_cache import CachedEmbeddings
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def test_a_locked_cache_falls_back_to_the_model(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    model = CountingEmbeddings()
+    cache = CachedEmbeddings(model, path, "test")
+    cache._conn.execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(path)
+
+    async def run():
+        assert await cache.aembed_query("cached") == [6.0, 1.0]
+        other.execute("BEGIN EXCLUSIVE")
+        try:
+            # the hit cannot be recorded and the new vector cannot be stored, but both still come back
+            assert await cache.aembed_documents(["cached", "fresh"]) == [[6.0, 1.0], [5.0, 1.0]]
+        finally:
+            other.rollback()
+        assert model.calls == 2
+        # nothing was left half-written: the lock is gone and "fresh" was never stored
+        assert await cache.aembed_query("fresh") == [5.0, 1.0]
+        assert model.calls == 3
+        assert await cache.aembed_query("fresh") == [5.0, 1.0]
+        assert model.calls == 3
+
+    asyncio.run(run())
+    other.close()
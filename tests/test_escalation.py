@@ -0,0 +1,112 @@
+import asyncio
+
+from escalation import EscalationDispatcher, TwilioTransport
+from fakes import FakeTwilioClient
+from shared_state import MemoryStore
+
+
+class FlakyTwilioClient(FakeTwilioClient):
+    """
+    Fails the first `failures` calls, then places them.
+    """
+
+    def __init__(self, failures: int):
+        super().__init__(latency=0.0)
+        self.failures = failures
+        self.attempts = 0
+
+    def _create(self, **kwargs):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("Twilio unavailable")
+        return super()._create(**kwargs)
+
+
+def dispatcher(client, **kwargs) -> EscalationDispatcher:
+    transport = TwilioTransport("AC-test", "token", "+15550000000", "+15551111111", client=client)
+    kwargs.setdefault("retry_base_seconds", 0.01)
+    return EscalationDispatcher(transport, store=MemoryStore(), **kwargs)
+
+
+def test_one_call_per_session_within_the_dedup_window():
+    client = FakeTwilioClient(latency=0.0)
+
+    async def run():
+        calls = dispatcher(client)
+        assert await calls.escalate("s1")
+        assert not await calls.escalate("s1")
+        assert await calls.escalate("s2")
+        # without a session there is nothing to deduplicate on
+        assert await calls.escalate(None) and await calls.escalate(None)
+        await calls.stop()
+
+    asyncio.run(run())
+    assert len(client.created) == 4
+    assert client.created[0]["to"] == "+15551111111"
+
+
+def test_failed_calls_are_retried_with_backoff():
+    client = FlakyTwilioClient(failures=2)
+
+    async def run():
+        calls = dispatcher(client, max_attempts=5)
+        assert await calls.escalate("s1")
+        await calls.stop()
+
+    asyncio.run(run())
+    assert client.attempts == 3
+    assert len(client.created) == 1
+
+
+def test_giving_up_clears_the_dedup_entry():
+    client = FlakyTwilioClient(failures=100)
+
+    async def run():
+        calls = dispatcher(client, max_attempts=2)
+        assert await calls.escalate("s1")
+        await calls.stop()
+        assert client.attempts == 2
+        assert await calls.store.get("s1") is None
+        # the next crisis message in the session tries again
+        assert await calls.escalate("s1")
+        await calls.stop()
+
+    asyncio.run(run())
+    assert client.attempts == 4
+    assert client.created == []
+
+
+def test_stop_waits_for_queued_calls():
+    client = FakeTwilioClient(latency=0.02)
+
+    async def run():
+        calls = dispatcher(client)
+        for session in ("s1", "s2", "s3"):
+            await calls.escalate(session)
+        assert client.created == []
+        await calls.stop()
+        assert len(client.created) == 3
+
+    asyncio.run(run())
+
+
+def test_batch_answers_do_not_place_calls(monkeypatch):
+    import ai_agent
+    from langchain_core.messages import HumanMessage
+
+    client = FakeTwilioClient(latency=0.0)
+
+    async def run():
+        calls = dispatcher(client)
+        monkeypatch.setattr(ai_agent, "emergency_dispatcher", calls)
+        state = {"input": HumanMessage(content="I want to kill myself"), "session_id": "s1"}
+        batch = await ai_agent.emergency_call_tool({**state, "dispatch_emergency": False})
+        assert "emergency number" in batch["output_emergency_specialist"]
+        await calls.stop()
+        assert client.created == []
+
+        await ai_agent.emergency_call_tool(state)
+        await calls.stop()
+        assert len(client.created) == 1
+
+    asyncio.run(run())
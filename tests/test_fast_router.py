@@ -0,0 +1,28 @@
+import json
+import os
+
+import pytest
+
+from config import LOCAL_ROUTER_MIN_CONFIDENCE
+from fast_router import local_router
+
+EVAL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "routing_eval.jsonl")
+
+with open(EVAL_PATH, encoding="utf-8") as f:
+    ROWS = [json.loads(line) for line in f if line.strip()]
+
+CRISIS = [row["message"] for row in ROWS if "emergency" in row["labels"]]
+NOT_CRISIS = [row["message"] for row in ROWS if "emergency" not in row["labels"]]
+
+
+@pytest.mark.parametrize("message", CRISIS)
+def test_crisis_messages_are_never_answered_locally_without_emergency(message):
+    tools, confidence = local_router.route(message)
+    # either the regex tier caught it, or the LLM router gets to decide
+    assert "emergency" in tools or confidence < LOCAL_ROUTER_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("message", NOT_CRISIS)
+def test_other_messages_never_place_a_call_from_the_local_tiers(message):
+    tools, confidence = local_router.route(message)
+    assert not ("emergency" in tools and confidence >= LOCAL_ROUTER_MIN_CONFIDENCE)
@@ -0,0 +1,17 @@
+from memory import estimate_tokens, split_window
+
+
+def turn(tokens: int) -> dict:
+    return {"role": "user", "content": "x" * (tokens - 1) * 4}
+
+
+def test_split_window_waits_for_the_high_water_mark():
+    history = [turn(100) for _ in range(25)]
+    assert split_window(history, budget=1000, high_water=2500) == ([], history)
+
+    history.append(turn(100))
+    older, window = split_window(history, budget=1000, high_water=2500)
+    assert older + window == history
+    assert sum(estimate_tokens(t["content"]) for t in window) <= 1000
+    # the next summary is another high_water - budget tokens away
+    assert split_window(window + [turn(100)] * 10, budget=1000, high_water=2500)[0] == []
@@ -0,0 +1,71 @@
+import asyncio
+
+import fakeredis
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+from redis_checkpointer import RedisCheckpointer
+
+
+def two_clients():
+    server = fakeredis.FakeServer()
+    return fakeredis.FakeAsyncRedis(server=server), fakeredis.FakeAsyncRedis(server=server)
+
+
+def test_checkpoint_round_trip_and_pending_writes():
+    async def run():
+        a, b = two_clients()
+        writer, reader = RedisCheckpointer(a, prefix="t:", ttl_seconds=60), RedisCheckpointer(b, prefix="t:")
+        config = {"configurable": {"thread_id": "s1", "checkpoint_ns": ""}}
+
+        first = empty_checkpoint()
+        first["channel_values"] = {"summary": "felt anxious"}
+        first_config = await writer.aput(config, first, {"source": "input", "step": 0}, {})
+        await writer.aput_writes(first_config, [("history", ["hi"]), ("summary", "still anxious")], "task-a")
+        await writer.aput_writes(first_config, [("history", ["ignored"])], "task-a")
+
+        saved = await reader.aget_tuple(config)
+        assert saved.checkpoint["id"] == first["id"]
+        assert saved.checkpoint["channel_values"] == {"summary": "felt anxious"}
+        assert saved.metadata["step"] == 0
+        assert saved.parent_config is None
+        # a task's writes are kept once, in order
+        assert saved.pending_writes == [("task-a", "history", ["hi"]), ("task-a", "summary", "still anxious")]
+        assert 0 < await a.ttl("t:session:s1:") <= 60
+
+        second = create_checkpoint(first, None, 1)
+        second_config = await writer.aput(first_config, second, {"source": "loop", "step": 1}, {})
+        saved = await reader.aget_tuple(config)
+        assert saved.checkpoint["id"] == second["id"]
+        assert saved.parent_config["configurable"]["checkpoint_id"] == first["id"]
+        assert saved.pending_writes == []
+        # only the latest checkpoint is kept
+        assert await reader.aget_tuple(first_config) is None
+        assert [t.config async for t in reader.alist(config)] == [second_config]
+
+        await reader.adelete_thread("s1")
+        assert await writer.aget_tuple(config) is None
+        assert await a.keys("t:*") == []
+
+    asyncio.run(run())
+
+
+def test_session_continues_on_another_worker():
+    import ai_agent
+    import fakes
+
+    fakes.install(latency=0.0)
+
+    async def run():
+        a, b = two_clients()
+        first = ai_agent.build_mental_health_graph(checkpointer=RedisCheckpointer(a, prefix="t:"))
+        second = ai_agent.build_mental_health_graph(checkpointer=RedisCheckpointer(b, prefix="t:"))
+        config = {"configurable": {"thread_id": "s1"}}
+        await first.ainvoke({"input": HumanMessage(content="I feel anxious"), "session_id": "s1"}, config=config, durability="exit")
+        await second.ainvoke({"input": HumanMessage(content="still anxious today"), "session_id": "s1"}, config=config, durability="exit")
+        state = await first.aget_state(config)
+        assert [turn["content"] for turn in state.values["history"] if turn["role"] == "user"] == [
+            "I feel anxious", "still anxious today",
+        ]
+
+    asyncio.run(run())
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+import memory
+from memory_checkpointer import MemoryCheckpointer
+
+
+async def save(saver, thread_id: str, parent_config: dict = None, step: int = 0) -> dict:
+    config = parent_config or {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    checkpoint = create_checkpoint(empty_checkpoint(), None, step)
+    return await saver.aput(config, checkpoint, {"source": "loop", "step": step}, {})
+
+
+def test_memory_checkpointer_keeps_the_latest_checkpoint_and_its_writes():
+    async def run():
+        saver = MemoryCheckpointer()
+        config = {"configurable": {"thread_id": "s1", "checkpoint_ns": ""}}
+        first = await save(saver, "s1")
+        await saver.aput_writes(first, [("history", ["hi"]), ("summary", "anxious")], "task-a")
+        await saver.aput_writes(first, [("history", ["ignored"])], "task-a")
+        saved = await saver.aget_tuple(config)
+        assert saved.config == first
+        assert saved.pending_writes == [("task-a", "history", ["hi"]), ("task-a", "summary", "anxious")]
+
+        second = await save(saver, "s1", first, step=1)
+        saved = await saver.aget_tuple(config)
+        assert saved.config == second
+        assert saved.parent_config == first
+        assert saved.pending_writes == []
+        assert await saver.aget_tuple(first) is None
+        # writes against the replaced checkpoint are dropped
+        await saver.aput_writes(first, [("history", ["late"])], "task-b")
+        assert (await saver.aget_tuple(config)).pending_writes == []
+
+        await saver.adelete_thread("s1")
+        assert await saver.aget_tuple(config) is None
+
+    asyncio.run(run())
+
+
+def test_memory_checkpointer_is_bounded_by_sessions_and_ttl():
+    async def run():
+        saver = MemoryCheckpointer(max_sessions=2, ttl_seconds=0.05)
+        for thread_id in ("s1", "s2", "s3"):
+            await save(saver, thread_id)
+        assert await saver.aget_tuple({"configurable": {"thread_id": "s1"}}) is None
+        assert await saver.aget_tuple({"configurable": {"thread_id": "s3"}}) is not None
+        time.sleep(0.1)
+        assert await saver.aget_tuple({"configurable": {"thread_id": "s3"}}) is None
+
+    asyncio.run(run())
+
+
+def test_sqlite_saver_prunes_old_checkpoints_and_idle_sessions(tmp_path):
+    import aiosqlite
+    from sqlite_checkpointer import PrunedSqliteSaver
+
+    async def count(conn, table: str, thread_id: str) -> int:
+        cursor = await conn.execute(f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,))
+        return (await cursor.fetchone())[0]
+
+    async def run():
+        conn = await aiosqlite.connect(str(tmp_path / "sessions.sqlite"))
+        try:
+            saver = PrunedSqliteSaver(conn, ttl_seconds=3600, prune_interval_seconds=0)
+            await saver.setup()
+            first = await save(saver, "s1")
+            await saver.aput_writes(first, [("history", ["hi"])], "task-a")
+            second = await save(saver, "s1", first, step=1)
+            assert await count(conn, "checkpoints", "s1") == 1
+            assert await count(conn, "writes", "s1") == 0
+            assert (await saver.aget_tuple({"configurable": {"thread_id": "s1", "checkpoint_ns": ""}})).config == second
+
+            # s1 has been idle for longer than the TTL by the time s2 is saved
+            saver.ttl_seconds = 0
+            await save(saver, "s2")
+            assert await count(conn, "checkpoints", "s1") == 0
+            assert await count(conn, "checkpoints", "s2") == 1
+        finally:
+            await conn.close()
+
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_long_session_keeps_one_checkpoint(backend, monkeypatch, tmp_path):
+    import ai_agent
+    import fakes
+
+    fakes.install(latency=0.0)
+    monkeypatch.setattr(memory, "MEMORY_SQLITE_PATH", str(tmp_path / "sessions.sqlite"))
+
+    async def run():
+        saver, close = await memory.open_checkpointer(backend)
+        try:
+            graph = ai_agent.build_mental_health_graph(checkpointer=saver)
+            config = {"configurable": {"thread_id": "s1"}}
+            for turn in range(10):
+                message = HumanMessage(content=f"turn {turn}: I feel anxious")
+                await graph.ainvoke({"input": message, "session_id": "s1"}, config=config, durability="exit")
+            state = await graph.aget_state(config)
+            assert sum(t["role"] == "user" for t in state.values["history"]) == 10
+            if backend == "memory":
+                assert len(saver.sessions) == 1
+            else:
+                cursor = await saver.conn.execute("SELECT COUNT(*) FROM checkpoints")
+                assert (await cursor.fetchone())[0] == 1
+        finally:
+            await close()
+
+    asyncio.run(run())
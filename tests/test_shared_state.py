@@ -0,0 +1,71 @@
+import asyncio
+
+import fakeredis
+import httpx
+
+import config
+import shared_state
+from shared_state import RedisStore
+
+
+def two_clients():
+    # two workers' connections to the same Redis
+    server = fakeredis.FakeServer()
+    return fakeredis.FakeAsyncRedis(server=server), fakeredis.FakeAsyncRedis(server=server)
+
+
+def test_add_dedups_across_clients():
+    async def run():
+        a, b = two_clients()
+        first, second = RedisStore("escalations", 900, client=a), RedisStore("escalations", 900, client=b)
+        assert await first.add("session-1", True)
+        assert not await second.add("session-1", True)
+        assert await second.add("session-2", True)
+        await first.delete("session-1")
+        assert await second.add("session-1", True)
+        assert 0 < await a.ttl(first.prefix + "session-2") <= 900
+
+    asyncio.run(run())
+
+
+def test_incr_ttl_is_set_on_create_and_not_extended():
+    async def run():
+        a, b = two_clients()
+        first, second = RedisStore("rate_limit", 60, client=a), RedisStore("rate_limit", 60, client=b)
+        assert await first.incr("host:1", 30) == 1
+        key = first.prefix + "host:1"
+        assert 0 < await a.ttl(key) <= 30
+        await a.expire(key, 5)
+        assert await second.incr("host:1", 30) == 2
+        assert await first.incr("host:1", 30) == 3
+        # later increments keep the expiry the counter was created with
+        assert 0 < await a.ttl(key) <= 5
+
+    asyncio.run(run())
+
+
+def test_rate_limit_returns_429_with_retry_after(monkeypatch):
+    import fakes
+    import main
+
+    app = fakes.install(latency=0.0, state_backend="redis")
+    monkeypatch.setattr(main, "RATE_LIMIT_REQUESTS", 2)
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+                codes = []
+                for _ in range(3):
+                    response = await client.post("/ask", json={"message": "what causes migraines?"})
+                    codes.append(response.status_code)
+                assert codes == [200, 200, 429]
+                assert 1 <= int(response.headers["Retry-After"]) <= config.RATE_LIMIT_WINDOW_SECONDS
+                # the counter lives in (fake) Redis, not in the worker
+                keys = await main.rate_limit_counters.client.keys(main.rate_limit_counters.prefix + "*")
+                assert len(keys) == 1
+
+    try:
+        asyncio.run(run())
+    finally:
+        shared_state._redis_clients.pop(config.REDIS_URL, None)